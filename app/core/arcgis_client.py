@@ -0,0 +1,195 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+import httpx
+from app.core.config import settings
+from app.core.metrics import arcgis_duration, arcgis_retries
+
+# Cliente HTTP compartido para todo el tráfico hacia ArcGIS: pool de
+# conexiones keep-alive, HTTP/2 opcional, reintentos con backoff y jitter
+# en 429/5xx y un circuit breaker para no insistir contra un servicio caído.
+# La API crea una instancia en su lifespan; el ETL crea la suya (mismo
+# código y configuración) dentro de su propio event loop.
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class ArcGISQueryError(Exception):
+    """El servicio respondió 200 pero con un objeto 'error' de ArcGIS."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+    @property
+    def retryable(self) -> bool:
+        # ArcGIS informa sobrecarga / timeouts / límite de tasa dentro de un
+        # 200 con el código HTTP equivalente; los 4xx son errores de consulta
+        return self.code is not None and (self.code == 429 or self.code >= 500)
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: demasiados fallos seguidos del servicio."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # en half-open pasa una sola llamada de prueba por vez
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Lanza CircuitOpenError si no se puede llamar; True si es la llamada de prueba."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise CircuitOpenError("Servicio ArcGIS no disponible temporalmente")
+        if state == "half-open":
+            self.probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        # la prueba terminó sin veredicto (consulta inválida, cancelación)
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = settings.arc_http2
+    if http2:
+        try:
+            import h2  # noqa: F401  dependencia opcional de httpx[http2]
+        except ImportError:
+            print("ARC_HTTP2 requiere el paquete 'h2'; se usa HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(settings.arc_timeout, connect=settings.arc_connect_timeout),
+        limits=httpx.Limits(
+            max_connections=settings.arc_pool_max_connections,
+            max_keepalive_connections=settings.arc_pool_max_keepalive,
+            keepalive_expiry=settings.arc_pool_keepalive_expiry,
+        ),
+    )
+
+
+class ArcGISClient:
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or settings.full_external_api_url
+        self.http = _build_http_client()
+        self.breaker = CircuitBreaker(
+            settings.arc_breaker_threshold, settings.arc_breaker_reset
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        # full jitter: evita que todas las páginas reintenten al mismo tiempo
+        return random.uniform(0, settings.arc_retry_backoff * (2 ** attempt))
+
+    async def query(self, params: Dict[str, Any], label: str = "") -> Dict[str, Any]:
+        """GET al endpoint /query; devuelve el JSON o lanza la última excepción."""
+        probe = self.breaker.before_call()
+        try:
+            return await self._query(params, label)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    async def _query(self, params: Dict[str, Any], label: str) -> Dict[str, Any]:
+        retries = settings.arc_max_retries
+        for attempt in range(retries + 1):
+            response = None
+            t0 = time.perf_counter()
+            try:
+                response = await self.http.get(self.url, params=params)
+                response.raise_for_status()
+                data = response.json()
+                if "error" in data:
+                    error = data["error"] or {}
+                    try:
+                        code = int(error.get("code"))
+                    except (TypeError, ValueError):
+                        code = None
+                    raise ArcGISQueryError(error.get("message", "Desconocido"), code)
+                arcgis_duration.observe(time.perf_counter() - t0, outcome="ok")
+                self.breaker.record_success()
+                return data
+            except (httpx.TransportError, httpx.HTTPStatusError, ArcGISQueryError) as e:
+                arcgis_duration.observe(time.perf_counter() - t0, outcome="error")
+                status = response.status_code if response is not None else None
+                # solo fallos del servicio (red, 429 / 5xx, también como
+                # 'error' de ArcGIS en un 200) cuentan para el circuito; una
+                # consulta mal formada (4xx) no debe cortar las demás rutas
+                retryable = (
+                    isinstance(e, httpx.TransportError)
+                    or (isinstance(e, httpx.HTTPStatusError) and status in RETRY_STATUS)
+                    or (isinstance(e, ArcGISQueryError) and e.retryable)
+                )
+                if not retryable:
+                    raise
+                if attempt >= retries:
+                    self.breaker.record_failure()
+                    raise
+                arcgis_retries.inc()
+                delay = self._retry_delay(attempt, response)
+                reason = f"error {e.code}" if isinstance(e, ArcGISQueryError) else status or repr(e)
+                print(f"ArcGIS query {label} failed ({reason}), retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Instancia de la API (se crea y se cierra en el lifespan de app.main)
+_client: Optional[ArcGISClient] = None
+
+
+async def start_arcgis_client():
+    global _client
+    if _client is None:
+        _client = ArcGISClient()
+    return _client
+
+
+async def stop_arcgis_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_arcgis_client() -> ArcGISClient:
+    if _client is None:
+        raise RuntimeError("ArcGISClient no inicializado (lifespan de la app)")
+    return _client
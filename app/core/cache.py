@@ -0,0 +1,249 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from app.core.config import settings
+from app.core.compression import negotiate_encoding
+
+# Cache de respuestas de la API de lectura. Los datos solo cambian cuando
+# corre el ETL, así que la clave combina ruta + parámetros + versión del
+# dataset (sync_state.dataset_version, que el ETL incrementa al confirmar
+# cambios). Al subir la versión las entradas viejas dejan de usarse y el
+# LRU las termina desalojando.
+
+
+class LRUCache:
+    """LRU en proceso acotado por número de entradas y por bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """Cache simple con expiración por tiempo (consultas al servicio ArcGIS)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+
+class RedisBacking:
+    """Segundo nivel compartido entre workers (opcional, requiere `redis`)."""
+
+    def __init__(self, url: str, ttl: int):
+        import redis  # dependencia opcional
+
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._client.get("api-cache:" + key)
+        except Exception:
+            return None
+
+    def set(self, key: str, value: bytes):
+        try:
+            self._client.set("api-cache:" + key, value, ex=self.ttl)
+        except Exception:
+            pass
+
+
+response_cache = LRUCache(settings.cache_max_entries, settings.cache_max_bytes)
+shared_cache = (
+    RedisBacking(settings.cache_redis_url, settings.cache_redis_ttl)
+    if settings.cache_redis_url else None
+)
+
+_version = {"value": None, "checked": 0.0}
+_version_lock = threading.Lock()
+
+
+def get_dataset_version() -> Optional[int]:
+    """Versión actual del dataset; se consulta a la base cada `cache_version_ttl` s."""
+    now = time.monotonic()
+    if now - _version["checked"] < settings.cache_version_ttl:
+        return _version["value"]
+    with _version_lock:
+        if now - _version["checked"] < settings.cache_version_ttl:
+            return _version["value"]
+        from app.db import SessionLocal
+        from app.models import SyncState
+
+        session = SessionLocal()
+        try:
+            state = session.get(SyncState, "mediciones")
+            _version["value"] = state.dataset_version if state else 0
+        except Exception:
+            _version["value"] = None  # sin versión no se cachea
+        finally:
+            session.close()
+        _version["checked"] = now
+    return _version["value"]
+
+
+def _encode_entry(status: int, headers: list, body: bytes) -> bytes:
+    meta = {"status": status, "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in headers]}
+    return json.dumps(meta).encode() + b"\n" + body
+
+
+def _decode_entry(raw: bytes):
+    meta, body = raw.split(b"\n", 1)
+    meta = json.loads(meta)
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in meta["headers"]]
+    return meta["status"], headers, body
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCacheMiddleware:
+    """
+    Middleware ASGI: cachea las respuestas 200 de GET bajo `prefixes` y les
+    agrega un ETag fuerte (derivado de la versión del dataset y la clave),
+    respondiendo 304 Not Modified cuando el cliente ya lo tiene.
+    """
+
+    def __init__(self, app, prefixes=("/meteorologico",)):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not settings.cache_enabled
+            or scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        version = await run_in_threadpool(get_dataset_version)
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        query = "&".join(sorted(scope.get("query_string", b"").decode("latin-1").split("&")))
+        # una entrada (y un ETag) por codificación: el cuerpo se guarda comprimido
+        encoding = negotiate_encoding(request_headers.get("accept-encoding")) or "identity"
+        key = f"v{version}:{encoding}:{scope['path']}?{query}"
+        etag = '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+        if _etag_matches(request_headers.get("if-none-match"), etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag.encode()), (b"vary", b"Accept-Encoding")],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        raw = response_cache.get(key)
+        if raw is None and shared_cache is not None:
+            raw = await run_in_threadpool(shared_cache.get, key)
+            if raw is not None:
+                response_cache.set(key, raw, len(raw))
+        if raw is not None:
+            status, headers, body = _decode_entry(raw)
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # MISS: se envía la respuesta mientras se acumula una copia acotada
+        state = {"status": None, "headers": None, "body": [], "size": 0, "cacheable": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                if message["status"] == 200:
+                    headers.append((b"etag", etag.encode()))
+                    state["cacheable"] = True
+                state["headers"] = headers
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and state["cacheable"]:
+                chunk = message.get("body", b"")
+                state["size"] += len(chunk)
+                if state["size"] > settings.cache_max_entry_bytes:
+                    state["cacheable"] = False
+                    state["body"] = []
+                else:
+                    state["body"].append(chunk)
+                if not message.get("more_body", False) and state["cacheable"]:
+                    entry = _encode_entry(state["status"], state["headers"], b"".join(state["body"]))
+                    response_cache.set(key, entry, len(entry))
+                    if shared_cache is not None:
+                        await run_in_threadpool(shared_cache.set, key, entry)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
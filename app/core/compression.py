@@ -0,0 +1,173 @@
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.config import settings
+
+# Compresión negociada (Accept-Encoding) de las respuestas, también las que
+# se envían por partes (StreamingResponse): cada bloque se comprime y se
+# vacía al cliente en cuanto llega. brotli y zstandard son opcionales; si no
+# están instalados solo se ofrece gzip.
+#
+# Va por dentro de ResponseCacheMiddleware: la cache guarda el cuerpo ya
+# comprimido (la clave incluye la codificación), así cada respuesta se
+# comprime una vez por versión del dataset y no en cada request.
+
+try:
+    import brotli  # dependencia opcional
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard  # dependencia opcional
+except ImportError:
+    zstandard = None
+
+# tipos que vale la pena comprimir (xlsx, parquet y .csv.gz ya vienen comprimidos)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/geo+json",
+    "application/geo+json-seq",
+    "application/x-ndjson",
+    "application/vnd.apache.arrow.stream",
+    "text/",
+)
+
+
+def available_encodings() -> tuple:
+    """Codificaciones del servidor en orden de preferencia (settings) que están instaladas."""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    names = [e.strip() for e in settings.compression_encodings.split(",")]
+    return tuple(e for e in names if installed.get(e))
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Codificación a usar según Accept-Encoding (con valores q) o None.
+    A igual q gana la preferencia del servidor.
+    """
+    if not settings.compression_enabled or not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for enc in available_encodings():
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Compressor:
+    """Compresor incremental: compress(chunk) devuelve lo que ya se puede enviar."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=settings.compression_brotli_quality)
+        else:
+            self._obj = zstandard.ZstdCompressor(level=settings.compression_zstd_level).compressobj()
+
+    def compress(self, chunk: bytes, final: bool) -> bytes:
+        if self.encoding == "gzip":
+            out = self._obj.compress(chunk)
+            return out + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            out = self._obj.process(chunk)
+            return out + (self._obj.finish() if final else self._obj.flush())
+        out = self._obj.compress(chunk)
+        return out + self._obj.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compresión gzip / br / zstd. Las respuestas de un solo
+    bloque menores a `compression_min_size` bytes se envían sin comprimir;
+    las que llegan por partes se comprimen siempre.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _vary_only(send):
+        # sin compresión igual se avisa a los proxies que la respuesta varía
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message.get("headers", [])))
+                if _compressible(headers):
+                    headers.add_vary_header("Accept-Encoding")
+                message = {**message, "headers": headers.raw}
+            await send(message)
+        return send_wrapper
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, self._vary_only(send))
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # se retiene hasta ver el primer bloque (tamaño / streaming)
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["compressor"] is None:
+                start = state["start"]
+                headers = MutableHeaders(raw=list(start.get("headers", [])))
+                if _compressible(headers):
+                    headers.add_vary_header("Accept-Encoding")
+                small = not more_body and len(body) < settings.compression_min_size
+                if small or start["status"] != 200 or not _compressible(headers):
+                    state["passthrough"] = True
+                    await send({**start, "headers": headers.raw})
+                    await send(message)
+                    return
+                headers["content-encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["content-length"]
+                state["compressor"] = _Compressor(encoding)
+                if not more_body:
+                    data = state["compressor"].compress(body, final=True)
+                    headers["content-length"] = str(len(data))
+                    await send({**start, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send({**start, "headers": headers.raw})
+
+            data = state["compressor"].compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseSettings
 import os
 from dotenv import load_dotenv
@@ -13,6 +14,67 @@ class Settings(BaseSettings):
     postgres_host: str = "db"
     postgres_port: int = 5432
     arc_batch_size: int = 2000
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    arc_concurrency: int = 4
+    arc_max_retries: int = 3
+    arc_retry_backoff: float = 0.5
+    arc_timeout: float = 60.0
+    arc_connect_timeout: float = 10.0
+    arc_http2: bool = False
+    arc_pool_max_connections: int = 20
+    arc_pool_max_keepalive: int = 10
+    arc_pool_keepalive_expiry: float = 30.0
+    arc_breaker_threshold: int = 5
+    arc_breaker_reset: float = 30.0
+    etl_batch_size: int = 1000
+    etl_commit_every: int = 0
+
+    # ETL programado dentro del servicio: cada worker lo intenta cada
+    # `sync_interval` s y un advisory lock de Postgres deja cargar a uno solo
+    sync_enabled: bool = True
+    sync_interval: float = 900.0
+    sync_initial_delay: float = 10.0
+    sync_lock_key: int = 72_401_001
+
+    cache_enabled: bool = True
+    cache_max_entries: int = 512
+    cache_max_bytes: int = 256 * 1024 * 1024
+    cache_max_entry_bytes: int = 32 * 1024 * 1024
+    cache_version_ttl: float = 5.0
+    cache_redis_url: Optional[str] = None
+    cache_redis_ttl: int = 24 * 3600
+
+    # compresión negociada de respuestas (br / zstd si están instalados)
+    compression_enabled: bool = True
+    compression_encodings: str = "zstd,br,gzip"  # preferencia del servidor
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 5
+    compression_zstd_level: int = 3
+
+    # instrumentación (/metrics); 0 desactiva el log de consultas lentas
+    metrics_enabled: bool = True
+    metrics_slow_query_ms: int = 500
+    # con varios workers: directorio compartido donde cada uno vuelca sus
+    # métricas para que /metrics las sume (vacío = solo el worker que responde)
+    metrics_multiproc_dir: Optional[str] = None
+    metrics_snapshot_interval: float = 5.0
+
+    # /series con resolution=raw: ventana y puntos máximos (se leen antes del LTTB)
+    series_raw_max_days: int = 366
+    series_raw_max_rows: int = 200_000
+    # /perfil: filas leídas y lances interpolados como máximo por request
+    perfil_max_rows: int = 500_000
+    perfil_max_casts: int = 20_000
+
+    # quién arma el GeoJSON de los listados grandes: "python" o "db" (Postgres)
+    geojson_render: str = "python"
+
+    # "db": /anios y /anio/{year}/estaciones desde la tabla local `mediciones`
+    # "arcgis": consultas de estadísticas al FeatureServer (cacheadas)
+    meteorologia_backend: str = "db"
+    arcgis_cache_ttl: float = 600.0
 
     APP_NAME: str = os.getenv("APP_NAME", "Mi API")
     APP_VERSION: str = os.getenv("APP_VERSION", "1.0.0")
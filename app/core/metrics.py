@@ -0,0 +1,443 @@
+import json
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from starlette.routing import Match
+from app.core.config import settings
+
+# Métricas en proceso con exposición en formato de texto Prometheus
+# (GET /metrics). Cubren latencia y tamaño de respuesta por ruta, consultas
+# SQL (por sentencia y por request), espera del pool de conexiones, latencia
+# de ArcGIS y etapas del ETL. Sin dependencias externas.
+#
+# Cada worker de gunicorn tiene sus propios contadores. Con
+# `metrics_multiproc_dir` configurado, cada worker vuelca su estado a
+# `<dir>/metrics_<pid>.json` (cada `metrics_snapshot_interval` s y al
+# atender /metrics) y /metrics suma los volcados de todos los workers.
+# Sin ese directorio, /metrics muestra solo el worker que atendió el
+# scrape. El directorio debe vaciarse al arrancar el servicio (ver
+# docker-compose.yml): los volcados de workers terminados se siguen
+# sumando en contadores e histogramas, no en gauges.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+ETL_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    @property
+    def family(self) -> str:
+        # nombre de la familia en HELP / TYPE
+        return self.name
+
+    def header(self):
+        return [f"# HELP {self.family} {self.documentation}", f"# TYPE {self.family} {self.kind}"]
+
+    def snapshot(self) -> list:
+        """[(etiquetas, valor)] del proceso actual."""
+        with self._lock:
+            return [(k, list(v) if isinstance(v, list) else v) for k, v in self._values.items()]
+
+    def merge(self, snapshots) -> list:
+        """Suma los volcados [(pid_vivo, items)] de todos los workers."""
+        merged = {}
+        for _alive, items in snapshots:
+            for key, value in items:
+                merged[key] = merged.get(key, 0.0) + value
+        return list(merged.items())
+
+    def render(self, items=None):
+        return self.header() + self.lines(self.snapshot() if items is None else items)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    @property
+    def family(self) -> str:
+        return f"{self.name}_total"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def lines(self, items):
+        return [f"{self.family}{_label_str(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), multiprocess_mode: str = "livesum"):
+        super().__init__(name, documentation, labels)
+        # "livesum": suma de los workers vivos; "max": el mayor de todos
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def merge(self, snapshots) -> list:
+        if self.multiprocess_mode == "max":
+            merged = {}
+            for _alive, items in snapshots:
+                for key, value in items:
+                    merged[key] = max(merged.get(key, value), value)
+            return list(merged.items())
+        return super().merge([(alive, items) for alive, items in snapshots if alive])
+
+    def lines(self, items):
+        return [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [conteos por bucket..., suma, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            i = bisect_left(self.buckets, value)  # primer bucket con value <= le
+            if i < len(self.buckets):
+                data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def totals(self, **labels) -> Tuple[float, int]:
+        """(suma, cantidad) acumuladas para una combinación de etiquetas."""
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            data = self._values.get(key)
+            return (data[-2], data[-1]) if data else (0.0, 0)
+
+    def merge(self, snapshots) -> list:
+        merged = {}
+        for _alive, items in snapshots:
+            for key, data in items:
+                total = merged.get(key)
+                merged[key] = list(data) if total is None else [a + b for a, b in zip(total, data)]
+        return list(merged.items())
+
+    def lines(self, items):
+        lines = []
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                le = _label_str(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_str(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {data[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {data[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self, snapshots=None) -> str:
+        """snapshots: [(pid_vivo, {nombre: items})] de todos los workers, o None (solo este)."""
+        lines = []
+        for metric in self._metrics:
+            if snapshots is None:
+                lines.extend(metric.render())
+            else:
+                merged = metric.merge([(alive, data.get(metric.name, [])) for alive, data in snapshots])
+                lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests", "Requests HTTP atendidos", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Latencia de los requests HTTP", ("method", "route")))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Bytes enviados en el cuerpo de la respuesta",
+    ("method", "route"), SIZE_BUCKETS))
+http_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "Requests HTTP en curso"))
+
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Duración de cada sentencia SQL", ("engine",)))
+db_slow_queries = registry.register(Counter(
+    "db_slow_queries", "Sentencias SQL más lentas que metrics_slow_query_ms", ("engine",)))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "Sentencias SQL por request", ("route",), COUNT_BUCKETS))
+db_time_per_request = registry.register(Histogram(
+    "db_time_per_request_seconds", "Tiempo total en SQL por request", ("route",)))
+db_pool_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool", ("engine",)))
+
+arcgis_duration = registry.register(Histogram(
+    "arcgis_request_duration_seconds", "Latencia de cada intento contra ArcGIS", ("outcome",)))
+arcgis_retries = registry.register(Counter(
+    "arcgis_retries", "Reintentos de consultas a ArcGIS"))
+
+etl_stage_duration = registry.register(Histogram(
+    "etl_stage_duration_seconds", "Duración de cada etapa del ETL por corrida", ("stage",), ETL_BUCKETS))
+etl_rows = registry.register(Counter(
+    "etl_rows", "Filas procesadas por el ETL", ("result",)))
+etl_runs = registry.register(Counter(
+    "etl_runs", "Corridas del ETL (ok / error / busy / skipped)", ("result",)))
+etl_last_success = registry.register(Gauge(
+    "etl_last_success_timestamp_seconds", "Fin de la última corrida exitosa del ETL (epoch)",
+    multiprocess_mode="max"))
+
+
+# --- SQL -------------------------------------------------------------------
+
+# contadores del request actual (dict mutable: lo comparten los greenlets de asyncpg)
+_request_stats: ContextVar[Optional[dict]] = ContextVar("request_sql_stats", default=None)
+
+
+def instrument_engine(sync_engine, name: str):
+    """Registra los eventos de cursor que miden cada sentencia del motor."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration.observe(elapsed, engine=name)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["seconds"] += elapsed
+        slow_ms = settings.metrics_slow_query_ms
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            db_slow_queries.inc(engine=name)
+            print(f"Slow query ({name}, {elapsed * 1000:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # la sentencia falló: se descarta la marca de inicio pendiente
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+
+class PoolWaitTimer:
+    """Mide cuánto se espera al pool: with PoolWaitTimer("sync"): session.connection()."""
+
+    def __init__(self, engine_name: str):
+        self.engine_name = engine_name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        db_pool_wait.observe(time.perf_counter() - self._t0, engine=self.engine_name)
+
+
+# --- HTTP ------------------------------------------------------------------
+
+def _route_label(scope) -> str:
+    # plantilla de la ruta (/mediciones/anio/{year}), no la URL concreta
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        # respuestas servidas por la cache no pasan por el router
+        for candidate in scope["app"].routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia, tamaño de respuesta y SQL por request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"queries": 0, "seconds": 0.0}
+        token = _request_stats.set(stats)
+        state = {"status": 500, "size": 0}
+        t0 = time.perf_counter()
+        http_in_progress.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            http_in_progress.dec()
+            _request_stats.reset(token)
+            route = _route_label(scope)
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=str(state["status"]))
+            http_duration.observe(elapsed, method=method, route=route)
+            http_response_size.observe(state["size"], method=method, route=route)
+            db_queries_per_request.observe(stats["queries"], route=route)
+            db_time_per_request.observe(stats["seconds"], route=route)
+
+
+# --- varios workers -----------------------------------------------------------
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.metrics_multiproc_dir, f"metrics_{pid}.json")
+
+
+def write_snapshot():
+    """Vuelca las métricas de este proceso al directorio compartido."""
+    if not settings.metrics_multiproc_dir:
+        return
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry.snapshot(), f)
+    # reemplazo atómico: quien lee nunca ve un archivo a medio escribir
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots() -> list:
+    snapshots = []
+    directory = settings.metrics_multiproc_dir
+    for name in os.listdir(directory):
+        if not (name.startswith("metrics_") and name.endswith(".json")):
+            continue
+        try:
+            pid = int(name[len("metrics_"):-len(".json")])
+            with open(os.path.join(directory, name)) as f:
+                data = json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Metrics: volcado ilegible {name}: {e}")
+            continue
+        # JSON guarda las etiquetas como listas
+        data = {metric: [(tuple(k), v) for k, v in items] for metric, items in data.items()}
+        snapshots.append((_pid_alive(pid), data))
+    return snapshots
+
+
+class SnapshotWriter:
+    """Hilo que vuelca las métricas del worker cada `interval` s."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            try:
+                write_snapshot()
+            except OSError as e:
+                print("Metrics: no se pudo volcar el estado:", e)
+            if self._stop.wait(self.interval):
+                return
+
+
+_writer: Optional[SnapshotWriter] = None
+
+
+def start_metrics_writer():
+    global _writer
+    if settings.metrics_enabled and settings.metrics_multiproc_dir and _writer is None:
+        os.makedirs(settings.metrics_multiproc_dir, exist_ok=True)
+        _writer = SnapshotWriter(settings.metrics_snapshot_interval)
+        _writer.start()
+    return _writer
+
+
+def stop_metrics_writer():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+        # estado final: sus contadores se siguen sumando tras la salida
+        write_snapshot()
+
+
+def render_metrics() -> str:
+    if not settings.metrics_multiproc_dir:
+        return registry.render()
+    write_snapshot()
+    return registry.render(_read_snapshots())
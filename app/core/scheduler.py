@@ -0,0 +1,138 @@
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from app.core.config import settings
+
+# ETL programado dentro del servicio. Cada worker de gunicorn tiene su hilo
+# que cada `sync_interval` s llama a app.etl.run_sync: el advisory lock deja
+# cargar a uno solo y, si otro worker ya corrió en este intervalo, la
+# corrida se omite (una carga por intervalo en todo el despliegue).
+
+
+class SyncScheduler:
+    def __init__(self, interval: float, initial_delay: float):
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.next_run_at: Optional[datetime] = None
+        self.running = False
+        self.last_result: Optional[dict] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        # una corrida en curso no se interrumpe: el hilo es daemon y, si el
+        # proceso sale antes, el lock se libera al cerrarse la conexión
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _wait(self, seconds: float) -> bool:
+        self.next_run_at = datetime.utcnow() + timedelta(seconds=seconds)
+        return not self._stop.wait(seconds)
+
+    def _loop(self):
+        from app.etl import run_sync
+
+        # jitter para que los workers no compitan por el lock en el mismo instante
+        delay = self.initial_delay + random.uniform(0, min(30.0, self.interval * 0.1))
+        while self._wait(delay):
+            self.running = True
+            try:
+                # margen del 10 %: el propio worker no se saltea su siguiente turno
+                self.last_result = run_sync(min_interval=self.interval * 0.9)
+            except Exception as e:
+                # p. ej. sin conexión a la base para tomar el lock
+                print("Sync scheduler error:", e)
+                self.last_result = {"status": "error", "error": str(e)}
+            finally:
+                self.running = False
+            delay = self.interval + random.uniform(0, min(30.0, self.interval * 0.1))
+
+
+_scheduler: Optional[SyncScheduler] = None
+
+
+def start_sync_scheduler():
+    global _scheduler
+    if settings.sync_enabled and _scheduler is None:
+        _scheduler = SyncScheduler(settings.sync_interval, settings.sync_initial_delay)
+        _scheduler.start()
+    return _scheduler
+
+
+def stop_sync_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() + "Z" if value else None
+
+
+def get_sync_status() -> dict:
+    """Última corrida (de cualquier worker, desde sync_state) + el scheduler local."""
+    from app.db import SessionLocal
+    from app.etl import SYNC_NAME
+    from app.models import SyncState
+
+    session = SessionLocal()
+    try:
+        state = session.get(SyncState, SYNC_NAME)
+        # alguien tiene el lock = hay una carga en curso en algún worker. Una
+        # clave bigint figura en pg_locks partida en classid (32 bits altos) y
+        # objid (32 bits bajos), con objsubid = 1, y por base de datos
+        key = settings.sync_lock_key
+        loading = session.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+                "AND database = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+                "AND classid = CAST(:hi AS oid) AND objid = CAST(:lo AS oid) AND objsubid = 1)"
+            ),
+            {"hi": (key >> 32) & 0xFFFFFFFF, "lo": key & 0xFFFFFFFF},
+        ).scalar()
+    finally:
+        session.close()
+
+    last_run = None
+    if state is not None and state.last_run_started_at is not None:
+        changed = None
+        if state.last_run_inserted is not None:
+            changed = state.last_run_inserted + (state.last_run_updated or 0)
+        last_run = {
+            "status": state.last_run_status,
+            "started_at": _iso(state.last_run_started_at),
+            "finished_at": _iso(state.last_run_finished_at),
+            "duration_s": state.last_run_duration_s,
+            "runner": state.last_run_by,
+            "rows_changed": changed,
+            "inserted": state.last_run_inserted,
+            "updated": state.last_run_updated,
+            "unchanged": state.last_run_unchanged,
+        }
+
+    scheduler = _scheduler
+    return {
+        "loading": bool(loading),
+        "last_run": last_run,
+        "last_error": {
+            "message": state.last_error,
+            "at": _iso(state.last_error_at),
+            "consecutive_failures": state.consecutive_failures,
+        } if state is not None and state.last_error else None,
+        "watermark_ms": state.watermark_ms if state else None,
+        "last_sync_at": _iso(state.last_sync_at) if state else None,
+        "dataset_version": state.dataset_version if state else None,
+        "scheduler": {
+            "enabled": settings.sync_enabled,
+            "interval_s": settings.sync_interval,
+            "next_run_at": _iso(scheduler.next_run_at) if scheduler else None,
+            "running_here": scheduler.running if scheduler else False,
+            "last_result_here": scheduler.last_result if scheduler else None,
+        },
+    }
@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from app.core.config import settings
+from app.core.metrics import instrument_engine, PoolWaitTimer
 
 DB_URL = (
     f"postgresql+psycopg2://{settings.postgres_user}:"
@@ -19,11 +21,41 @@ SessionLocal = sessionmaker(
     future=True
 )
 
+# Motor asyncio (asyncpg) para la API de lectura; el síncrono queda para
+# el ETL y las exportaciones que escriben archivos.
+ASYNC_DB_URL = DB_URL.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+
+async_engine = create_async_engine(
+    ASYNC_DB_URL,
+    pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# tiempos por sentencia SQL (el motor async se instrumenta en su sync_engine)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 Base = declarative_base()
 
 def get_db():
     db = SessionLocal()
     try:
+        # la conexión se pide acá para medir la espera del pool
+        with PoolWaitTimer("sync"):
+            db.connection()
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        with PoolWaitTimer("async"):
+            await db.connection()
+        yield db
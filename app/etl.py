@@ -1,76 +1,375 @@
-# script run by docker-compose loader service
+# ETL ArcGIS -> Postgres: lo corre el scheduler del servicio
+# (app.core.scheduler) o a mano con `python -m app.etl`
+import argparse
+import os
+import socket
+import sys
 import time
+from contextlib import contextmanager
 from datetime import datetime
+from sqlalchemy import literal_column, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
+from app.core.metrics import etl_stage_duration, etl_rows, etl_runs, etl_last_success
 from app.db import SessionLocal, engine, Base
-from app.models import Medicion
-from app.utils.arcgis_fetch_all import fetch_all_arcgis_records
+from app.models import Medicion, SyncState
+from app.services.catalog_service import refresh_catalog, catalog_is_empty
+from app.services.rollup_service import (
+    refresh_rollups,
+    refresh_pending_rollups,
+    rollups_are_empty,
+    mark_pending,
+)
+from app.utils.arcgis_fetch_all import iter_arcgis_pages
+from app.utils.date_utils import ms_to_datetime
+from app.utils.geo import cell_id
 
-# create tables if not exist
-Base.metadata.create_all(bind=engine)
+SYNC_NAME = "mediciones"
+RUNNER = f"{socket.gethostname()}:{os.getpid()}"
 
-def ms_to_datetime(ms):
-    if not ms:
-        return None
-    try:
-        return datetime.utcfromtimestamp(ms/1000)
-    except:
-        return None
+_schema_ready = False
+
+# columnas que se sobrescriben cuando el registro ya existe
+UPDATE_COLUMNS = (
+    "globalid", "estacion", "fecha_ms", "fecha", "longitud", "latitud",
+    "profundidad", "temperatura", "salinidad", "oxigeno",
+    "created_date_ms", "last_edited_date_ms", "celda",
+)
+
+def feature_to_row(attrs):
+    """ArcGIS attributes -> dict con las columnas de `mediciones`."""
+    fecha_ms = attrs.get("Fecha")
+    longitud = attrs.get("Longitud")
+    latitud = attrs.get("Latitud")
+    return {
+        "objectid": attrs.get("OBJECTID"),
+        "globalid": attrs.get("GlobalID"),
+        "estacion": attrs.get("Estacion"),
+        "fecha_ms": fecha_ms,
+        "fecha": ms_to_datetime(fecha_ms),
+        "longitud": longitud,
+        "latitud": latitud,
+        "profundidad": attrs.get("Profundidad"),
+        "temperatura": attrs.get("Temperatura"),
+        "salinidad": attrs.get("Salinidad"),
+        "oxigeno": attrs.get("Oxigeno"),
+        "created_date_ms": attrs.get("created_date"),
+        "last_edited_date_ms": attrs.get("last_edited_date"),
+        "celda": cell_id(longitud, latitud),
+    }
+
+def bulk_upsert(session, rows):
+    """
+    Inserta/actualiza un lote con INSERT ... ON CONFLICT (objectid) DO UPDATE.
+    Solo se actualizan las filas cuyo last_edited_date_ms cambió; el resto
+    se cuenta como 'unchanged'. Devuelve un dict con los contadores.
+    Los días afectados (estación y fecha nuevas y anteriores de cada fila
+    cambiada) quedan en serie_pendiente, en la misma transacción del lote.
+    """
+    # ON CONFLICT no admite el mismo objectid dos veces en un mismo INSERT
+    unique_rows = list({r["objectid"]: r for r in rows}.values())
+    if not unique_rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    table = Medicion.__table__
+    # `old` lee la instantánea previa al INSERT (mismo statement), así se
+    # conoce la estación y fecha anteriores de los registros que se actualizan
+    old = (
+        select(table.c.objectid, table.c.estacion, table.c.fecha)
+        .where(table.c.objectid.in_([r["objectid"] for r in unique_rows]))
+        .cte("old")
+    )
+    stmt = pg_insert(table).values(unique_rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.objectid],
+        set_={col: stmt.excluded[col] for col in UPDATE_COLUMNS},
+        where=table.c.last_edited_date_ms.is_distinct_from(
+            stmt.excluded.last_edited_date_ms
+        ),
+    ).returning(
+        table.c.objectid,
+        table.c.estacion,
+        table.c.fecha,
+        literal_column("(xmax = 0)").label("inserted"),
+    ).cte("upserted")
+
+    # RETURNING solo devuelve filas insertadas (xmax = 0) o actualizadas
+    changed = session.execute(
+        select(stmt.c.inserted, stmt.c.estacion, stmt.c.fecha, old.c.estacion, old.c.fecha)
+        .select_from(stmt.outerjoin(old, old.c.objectid == stmt.c.objectid))
+    ).all()
+    inserted = sum(1 for r in changed if r[0])
+    updated = len(changed) - inserted
+    buckets = set()
+    for _, estacion, fecha, estacion_anterior, fecha_anterior in changed:
+        buckets.add((estacion, fecha))
+        buckets.add((estacion_anterior, fecha_anterior))
+    mark_pending(session, buckets)
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": len(unique_rows) - inserted - updated,
+    }
+
+def get_watermark(session):
+    """
+    Último last_edited_date_ms cargado. Si aún no hay estado guardado se usa
+    el máximo de la tabla (instalaciones previas al modo incremental).
+    """
+    state = session.get(SyncState, SYNC_NAME)
+    if state and state.watermark_ms is not None:
+        return state.watermark_ms
+    return session.query(func.max(Medicion.last_edited_date_ms)).scalar()
+
+def _get_state(session):
+    state = session.get(SyncState, SYNC_NAME)
+    if state is None:
+        state = SyncState(name=SYNC_NAME, dataset_version=0, consecutive_failures=0)
+        session.add(state)
+    return state
 
-def upsert_records():
-    features = fetch_all_arcgis_records(where="1=1")
-    print(f"Fetched {len(features)} features")
+def save_watermark(session, watermark_ms, changed: bool = False):
+    """
+    Guarda el watermark; si la carga modificó datos incrementa además
+    dataset_version, que invalida la cache de respuestas de la API, y
+    limpia la marca de cambios pendientes de commits intermedios.
+    """
+    state = _get_state(session)
+    if changed:
+        state.dataset_version = (state.dataset_version or 0) + 1
+    state.pending_changes = False
+    if watermark_ms is not None:
+        state.watermark_ms = max(watermark_ms, state.watermark_ms or watermark_ms)
+    state.last_sync_at = datetime.utcnow()
+
+def watermark_where(watermark_ms):
+    """
+    Cláusula WHERE de ArcGIS para los registros editados desde el watermark.
+    ArcGIS compara con precisión de segundos, por eso se usa >= sobre el
+    segundo truncado: los registros repetidos quedan como 'unchanged'.
+    """
+    if watermark_ms is None:
+        return "1=1"
+    ts = datetime.utcfromtimestamp(watermark_ms // 1000).strftime("%Y-%m-%d %H:%M:%S")
+    return f"last_edited_date >= TIMESTAMP '{ts}'"
+
+def upsert_records(
+    full: bool = False,
+    batch_size: int | None = None,
+    commit_every: int | None = None,
+):
+    """
+    Pipeline fetch -> transform -> write: cada página de ArcGIS se escribe
+    en cuanto llega mientras las siguientes se descargan en segundo plano,
+    así la memoria no crece con el tamaño de la capa.
+    `commit_every` = páginas por commit (0 = un único commit al final).
+    """
+    batch_size = batch_size or settings.etl_batch_size
+    if commit_every is None:
+        commit_every = settings.etl_commit_every
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    # fetch = espera de páginas, transform = armado de filas, write = SQL
+    stages = {"fetch": 0.0, "transform": 0.0, "write": 0.0}
     session = SessionLocal()
     try:
-        for f in features:
-            attrs = f.get("attributes", {}) or {}
-            objid = attrs.get("OBJECTID")
-            if objid is None:
-                continue
-
-            fecha_ms = attrs.get("Fecha")
-            fecha_dt = ms_to_datetime(fecha_ms)
-
-            row = session.query(Medicion).filter_by(objectid=objid).first()
-            if row:
-                row.globalid = attrs.get("GlobalID")
-                row.estacion = attrs.get("Estacion")
-                row.fecha_ms = fecha_ms
-                row.fecha = fecha_dt
-                row.longitud = attrs.get("Longitud")
-                row.latitud = attrs.get("Latitud")
-                row.profundidad = attrs.get("Profundidad")
-                row.temperatura = attrs.get("Temperatura")
-                row.salinidad = attrs.get("Salinidad")
-                row.oxigeno = attrs.get("Oxigeno")
-                row.created_date_ms = attrs.get("created_date")
-                row.last_edited_date_ms = attrs.get("last_edited_date")
-            else:
-                row = Medicion(
-                    objectid = objid,
-                    globalid = attrs.get("GlobalID"),
-                    estacion = attrs.get("Estacion"),
-                    fecha_ms = fecha_ms,
-                    fecha = fecha_dt,
-                    longitud = attrs.get("Longitud"),
-                    latitud = attrs.get("Latitud"),
-                    profundidad = attrs.get("Profundidad"),
-                    temperatura = attrs.get("Temperatura"),
-                    salinidad = attrs.get("Salinidad"),
-                    oxigeno = attrs.get("Oxigeno"),
-                    created_date_ms = attrs.get("created_date"),
-                    last_edited_date_ms = attrs.get("last_edited_date")
-                )
-                session.add(row)
+        watermark = None if full else get_watermark(session)
+        # una corrida anterior confirmó datos y falló antes del commit final:
+        # la versión y los derivados (catálogo / series) siguen sin actualizar
+        state = session.get(SyncState, SYNC_NAME)
+        pending = bool(state and state.pending_changes)
+        if pending:
+            print("ETL: hay cambios confirmados de una corrida incompleta")
+        where = watermark_where(watermark)
+        print(f"ETL mode: {'full' if watermark is None else 'incremental'} (where={where})")
+
+        new_watermark = watermark
+        fetched = 0
+        pages = iter_arcgis_pages(where)
+        page_no = 0
+        while True:
+            t0 = time.perf_counter()
+            page = next(pages, None)
+            t1 = time.perf_counter()
+            stages["fetch"] += t1 - t0
+            if page is None:
+                break
+            page_no += 1
+            fetched += len(page)
+            rows = []
+            for f in page:
+                attrs = f.get("attributes", {}) or {}
+                if attrs.get("OBJECTID") is None:
+                    continue
+                row = feature_to_row(attrs)
+                edited = row["last_edited_date_ms"]
+                if edited is not None and (new_watermark is None or edited > new_watermark):
+                    new_watermark = edited
+                rows.append(row)
+            t2 = time.perf_counter()
+            stages["transform"] += t2 - t1
+
+            for i in range(0, len(rows), batch_size):
+                for k, v in bulk_upsert(session, rows[i:i + batch_size]).items():
+                    totals[k] += v
 
+            if commit_every and page_no % commit_every == 0:
+                # commits intermedios solo de datos: el watermark se guarda al
+                # final para que un fallo no salte registros de páginas pendientes.
+                # La marca pending_changes viaja en el mismo commit: si la
+                # corrida no termina, la siguiente igual invalida cache y derivados
+                if totals["inserted"] or totals["updated"]:
+                    _get_state(session).pending_changes = True
+                session.commit()
+            stages["write"] += time.perf_counter() - t2
+
+        print(f"Fetched {fetched} features")
+        t2 = time.perf_counter()
+        changed = bool(totals["inserted"] or totals["updated"] or pending)
+        if changed or catalog_is_empty(session):
+            refresh_catalog(session)
+        if rollups_are_empty(session):
+            refresh_rollups(session)
+            series_days = "todas"
+        else:
+            # solo los días / meses por estación con registros nuevos o
+            # modificados, también los pendientes de corridas que fallaron
+            series_days = refresh_pending_rollups(session)
+        save_watermark(session, new_watermark, changed=changed)
         session.commit()
-        print("ETL finished, committed")
+        stages["write"] += time.perf_counter() - t2
+        for stage, seconds in stages.items():
+            etl_stage_duration.observe(seconds, stage=stage)
+        for result, count in totals.items():
+            etl_rows.inc(count, result=result)
+        print("ETL stages: " + ", ".join(f"{k}={v:.2f}s" for k, v in stages.items()))
+        print(
+            "ETL finished, committed "
+            f"(inserted={totals['inserted']}, updated={totals['updated']}, "
+            f"unchanged={totals['unchanged']}, watermark={new_watermark}, "
+            f"series_dias={series_days})"
+        )
     except Exception as e:
         session.rollback()
         print("ETL error:", e)
+        raise
     finally:
         session.close()
+    return totals
+
+def ensure_schema():
+    """Crea las tablas que falten (una vez por proceso, con el lock tomado)."""
+    global _schema_ready
+    if not _schema_ready:
+        Base.metadata.create_all(bind=engine)
+        _schema_ready = True
+
+@contextmanager
+def sync_lock():
+    """
+    Advisory lock de sesión de Postgres: lo tiene a lo sumo un proceso, así
+    dos workers (o un worker y una corrida manual) nunca cargan a la vez.
+    Si el proceso muere la conexión se cierra y Postgres libera el lock.
+    """
+    with engine.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": settings.sync_lock_key}
+        ).scalar()
+        conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": settings.sync_lock_key})
+                conn.commit()
+
+def _start_run(min_interval: float | None) -> bool:
+    """Marca el inicio de la corrida; False si otro worker corrió hace menos de `min_interval` s."""
+    session = SessionLocal()
+    try:
+        state = _get_state(session)
+        started = state.last_run_started_at
+        if min_interval and started and (datetime.utcnow() - started).total_seconds() < min_interval:
+            return False
+        state.last_run_started_at = datetime.utcnow()
+        state.last_run_status = "running"
+        state.last_run_by = RUNNER
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+def _finish_run(duration: float, totals: dict | None, error: Exception | None):
+    session = SessionLocal()
+    try:
+        state = _get_state(session)
+        state.last_run_finished_at = datetime.utcnow()
+        state.last_run_duration_s = round(duration, 3)
+        if error is None:
+            state.last_run_status = "ok"
+            state.last_run_inserted = totals["inserted"]
+            state.last_run_updated = totals["updated"]
+            state.last_run_unchanged = totals["unchanged"]
+            state.consecutive_failures = 0
+        else:
+            state.last_run_status = "error"
+            state.last_run_inserted = state.last_run_updated = state.last_run_unchanged = None
+            state.last_error = f"{type(error).__name__}: {error}"[:4000]
+            state.last_error_at = state.last_run_finished_at
+            state.consecutive_failures = (state.consecutive_failures or 0) + 1
+        session.commit()
+    finally:
+        session.close()
+
+def run_sync(
+    full: bool = False,
+    commit_every: int | None = None,
+    min_interval: float | None = None,
+) -> dict:
+    """
+    Una corrida del ETL con el advisory lock tomado, registrando el resultado
+    en sync_state (GET /sync/status). Devuelve {"status": ok | error | busy |
+    skipped, ...}: busy = otro proceso está cargando, skipped = otro worker
+    corrió hace menos de `min_interval` s.
+    """
+    with sync_lock() as acquired:
+        if not acquired:
+            print("ETL: otro proceso tiene el lock de sincronización, se omite la corrida")
+            etl_runs.inc(result="busy")
+            return {"status": "busy"}
+        ensure_schema()
+        if not _start_run(min_interval):
+            etl_runs.inc(result="skipped")
+            return {"status": "skipped"}
+
+        t0 = time.perf_counter()
+        totals, error = None, None
+        try:
+            totals = upsert_records(full=full, commit_every=commit_every)
+        except Exception as e:
+            error = e
+        duration = time.perf_counter() - t0
+        _finish_run(duration, totals, error)
+
+    if error is not None:
+        etl_runs.inc(result="error")
+        return {"status": "error", "duration_s": round(duration, 3), "error": str(error)}
+    etl_runs.inc(result="ok")
+    etl_last_success.set(time.time())
+    return {"status": "ok", "duration_s": round(duration, 3), **totals}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga ArcGIS -> Postgres")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="ignora el watermark y recarga la capa completa",
+    )
+    parser.add_argument(
+        "--commit-every", type=int, default=None,
+        help="páginas por commit (0 = un único commit al final)",
+    )
+    args = parser.parse_args()
+
     t0 = time.time()
-    upsert_records()
+    result = run_sync(full=args.full, commit_every=args.commit_every)
     print("Elapsed:", time.time() - t0)
+    sys.exit(0 if result["status"] == "ok" else 1)
@@ -1,19 +1,57 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.cache import ResponseCacheMiddleware, response_cache
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, render_metrics, start_metrics_writer, stop_metrics_writer
+from app.core.arcgis_client import start_arcgis_client, stop_arcgis_client
+from app.core.scheduler import start_sync_scheduler, stop_sync_scheduler, get_sync_status
 from app.routes.antartica_routes import router as ant_router
 from app.routes.metereologia_routes import router as met_router
 from app.db import Base, engine
 from sqlalchemy import text
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        print(" Conectado a la base de datos correctamente.")
+    except Exception as e:
+        print(" Error al conectar a la base de datos:")
+        print(e)
+
+    # Pool HTTP compartido para todas las consultas a ArcGIS
+    await start_arcgis_client()
+    # ETL periódico en segundo plano (un solo worker carga por vez)
+    start_sync_scheduler()
+    # volcado de métricas para sumarlas entre workers (metrics_multiproc_dir)
+    start_metrics_writer()
+    try:
+        yield
+    finally:
+        stop_sync_scheduler()
+        await stop_arcgis_client()
+        stop_metrics_writer()
+
 app = FastAPI(
     title="API Antártica (cached DB)",
     description="FastAPI servicio que sirve datos convertidos desde ArcGIS (guardados en Postgres).",
     version="1.0",
-    docs_url="/swagger"
+    docs_url="/swagger",
+    lifespan=lifespan
 )
 
 
+# El último middleware agregado es el más externo: la compresión queda por
+# dentro de la cache, que guarda las respuestas ya comprimidas
+app.add_middleware(CompressionMiddleware)
+
+# Cache de respuestas versionada por el ETL (ETag / 304)
+app.add_middleware(ResponseCacheMiddleware, prefixes=("/meteorologico",))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -22,16 +60,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Crear las tablas al iniciar
-@app.on_event("startup")
-def startup_event():
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        print(" Conectado a la base de datos correctamente.")
-    except Exception as e:
-        print(" Error al conectar a la base de datos:")
-        print(e)
+# Latencia / tamaño / SQL por request; el más externo para medir todo
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(ant_router)
 app.include_router(met_router)
@@ -42,3 +72,15 @@ def root():
         "mensaje": "API Antártica lista",
         "arcgis": settings.full_external_api_url
     }
+
+@app.get("/cache/estadisticas")
+def cache_stats():
+    return response_cache.stats()
+
+@app.get("/sync/status")
+def sync_status():
+    return get_sync_status()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
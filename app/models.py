@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, BigInteger, DateTime
+from sqlalchemy import Column, Integer, String, Float, BigInteger, DateTime, Index, Text, Boolean
 from app.db import Base
 
 class Medicion(Base):
@@ -18,3 +18,112 @@ class Medicion(Base):
     oxigeno = Column(Float)
     created_date_ms = Column(BigInteger)
     last_edited_date_ms = Column(BigInteger)
+    celda = Column(Integer, index=True)  # celda de grilla lon/lat (app.utils.geo.cell_id)
+
+    # filtros por año = rango semiabierto sobre fecha (ver migrations/0001)
+    __table_args__ = (
+        Index("ix_mediciones_fecha", "fecha"),
+        Index("ix_mediciones_estacion_fecha", "estacion", "fecha"),
+    )
+
+
+class SyncState(Base):
+    """Estado de sincronización del ETL (high-water mark por capa)."""
+    __tablename__ = "sync_state"
+
+    name = Column(String(100), primary_key=True)
+    watermark_ms = Column(BigInteger)  # max last_edited_date ya cargado
+    last_sync_at = Column(DateTime)
+    dataset_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # datos confirmados por commits intermedios de una corrida que no terminó
+    pending_changes = Column(Boolean, nullable=False, default=False, server_default="false")
+
+    # última corrida del ETL (GET /sync/status)
+    last_run_started_at = Column(DateTime)
+    last_run_finished_at = Column(DateTime)
+    last_run_duration_s = Column(Float)
+    last_run_status = Column(String(20))  # running / ok / error
+    last_run_by = Column(String(100))     # host:pid del worker que cargó
+    last_run_inserted = Column(Integer)
+    last_run_updated = Column(Integer)
+    last_run_unchanged = Column(Integer)
+    last_error = Column(Text)
+    last_error_at = Column(DateTime)
+    consecutive_failures = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class CatalogoEstacionAnio(Base):
+    """Estaciones y años con datos (conteos por estación-año). Lo mantiene el ETL."""
+    __tablename__ = "catalogo_estacion_anio"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    estacion = Column(String(255), index=True)  # NULL = registros sin estación
+    anio = Column(Integer, index=True)          # NULL = registros sin fecha
+    registros = Column(Integer, nullable=False)
+    registros_geo = Column(Integer, nullable=False)  # con coordenadas válidas
+    longitud = Column(Float)  # posición media de la estación (coordenadas válidas)
+    latitud = Column(Float)
+
+
+class CatalogoProfundidad(Base):
+    """Profundidades medidas por estación (conteos). Lo mantiene el ETL."""
+    __tablename__ = "catalogo_profundidad"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    estacion = Column(String(255), index=True)
+    profundidad = Column(Float)
+    registros = Column(Integer, nullable=False)
+    registros_geo = Column(Integer, nullable=False)
+
+
+
+class _SerieMixin:
+    # min / max / media por variable; `registros` cuenta todas las filas del
+    # período y *_n los valores no nulos (para combinar medias entre series)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    estacion = Column(String(255))
+    profundidad = Column(Float)
+    periodo = Column(DateTime, nullable=False)  # inicio del día / mes (UTC)
+    registros = Column(Integer, nullable=False)
+    temperatura_min = Column(Float)
+    temperatura_max = Column(Float)
+    temperatura_media = Column(Float)
+    temperatura_n = Column(Integer)
+    salinidad_min = Column(Float)
+    salinidad_max = Column(Float)
+    salinidad_media = Column(Float)
+    salinidad_n = Column(Integer)
+    oxigeno_min = Column(Float)
+    oxigeno_max = Column(Float)
+    oxigeno_media = Column(Float)
+    oxigeno_n = Column(Integer)
+
+
+class SerieDiaria(_SerieMixin, Base):
+    """Rollup diario por estación y profundidad. Lo mantiene el ETL."""
+    __tablename__ = "serie_diaria"
+    __table_args__ = (
+        Index("ix_serie_diaria_estacion_periodo", "estacion", "periodo"),
+        Index("ix_serie_diaria_periodo", "periodo"),
+    )
+
+
+class SerieMensual(_SerieMixin, Base):
+    """Rollup mensual por estación y profundidad. Lo mantiene el ETL."""
+    __tablename__ = "serie_mensual"
+    __table_args__ = (
+        Index("ix_serie_mensual_estacion_periodo", "estacion", "periodo"),
+        Index("ix_serie_mensual_periodo", "periodo"),
+    )
+
+
+class SeriePendiente(Base):
+    """
+    Días por estación con mediciones nuevas o modificadas que las series aún
+    no reflejan. El ETL los anota con cada lote (mismo commit que los datos)
+    y los vacía al recalcular los rollups.
+    """
+    __tablename__ = "serie_pendiente"
+
+    estacion = Column(String(255), primary_key=True)
+    dia = Column(DateTime, primary_key=True)
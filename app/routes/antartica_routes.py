@@ -1,74 +1,143 @@
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional
 from fastapi import APIRouter, Query, HTTPException, Depends
 from sqlalchemy.orm import Session
-from fastapi.responses import StreamingResponse
-import openpyxl
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse, FileResponse, ORJSONResponse, Response
+from starlette.background import BackgroundTask
 from openpyxl.workbook import Workbook
-from io import BytesIO
-from app.db import get_db
-from app.services import db_service
+from app.core.config import settings
+from app.db import get_db, get_async_db
+from app.services import db_service, async_db_service, export_service
+from app.services.rollup_service import next_period
+from app.utils.columnar import stream_arrow, stream_parquet, columnar_json, require_pyarrow
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.date_utils import to_naive_utc
+from app.utils.downsample import lttb
+from app.utils.geo import BBox, Near, parse_bbox, parse_near, zoom_cell_deg
 from app.utils.geojson_converter import features_to_geojson_from_db
+from app.utils.profiles import (
+    STANDARD_LEVELS,
+    VARIABLES,
+    build_profiles,
+    mean_profile,
+    parse_levels,
+)
+from app.utils.geojson_stream import (
+    stream_feature_collection,
+    stream_feature_sequence,
+    raw_feature_collection,
+)
 
 router = APIRouter(prefix="/meteorologico", tags=["Meteorologico"])
 
+# Los listados de features devuelven ORJSONResponse directamente: FastAPI
+# no pasa la respuesta por jsonable_encoder y orjson codifica a bytes.
+#
+# render=db: Postgres arma el GeoJSON (json_build_object/json_agg) y la API
+# reenvía el texto sin construir dicts por fila.
+RENDER_QUERY = Query(settings.geojson_render, regex="^(python|db)$")
+
+def json_bytes_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def spatial_area(
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    near: Optional[str] = Query(None, description="lon,lat del centro (requiere radius)"),
+    radius: Optional[float] = Query(None, gt=0, description="Radio en metros"),
+) -> BBox | Near | None:
+    """Filtro espacial opcional de los listados de mediciones."""
+    if bbox and near:
+        raise HTTPException(status_code=400, detail="Use bbox o near, no ambos")
+    try:
+        if bbox:
+            return parse_bbox(bbox)
+        if near:
+            if radius is None:
+                raise HTTPException(status_code=400, detail="near requiere radius (metros)")
+            return parse_near(near, radius)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Filtro espacial inválido: {e}")
+    return None
+
 @router.get("/estacion/{nombre}")
-def endpoint_by_station(nombre: str, limit: int = 100, offset: int = 0):
-    rows = db_service.get_by_station(nombre, limit=limit, offset=offset)
+async def endpoint_by_station(
+    nombre: str,
+    limit: int = 100,
+    offset: int = 0,
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = await async_db_service.get_by_station(db, nombre, limit=limit, offset=offset, area=area)
     if not rows:
-        return {"exito": True, "count": 0, "type": "FeatureCollection", "features": []}
+        return ORJSONResponse({"exito": True, "count": 0, "type": "FeatureCollection", "features": []})
     features = features_to_geojson_from_db(rows)
-    return {"exito": True, "count": len(features), "type": "FeatureCollection", "features": features}
+    return ORJSONResponse({"exito": True, "count": len(features), "type": "FeatureCollection", "features": features})
 
 @router.get("/stations")
-def endpoint_all_stations(db: Session = Depends(get_db)):
-    stations = db_service.get_all_stations(db)
+async def endpoint_all_stations(db: AsyncSession = Depends(get_async_db)):
+    stations = await async_db_service.get_all_stations(db)
     return {
         "total": len(stations),
         "stations": stations
     }
 
 @router.get("/objectid/{oid}")
-def endpoint_objectid(oid: int):
-    row = db_service.get_by_objectid(oid)
+async def endpoint_objectid(oid: int, db: AsyncSession = Depends(get_async_db)):
+    row = await async_db_service.get_by_objectid(db, oid)
     if not row:
         raise HTTPException(status_code=404, detail="objectid not found")
     feature = features_to_geojson_from_db([row])[0]
-    return {"type": "FeatureCollection", "features": [feature]}
+    return ORJSONResponse({"type": "FeatureCollection", "features": [feature]})
 
 @router.get("/years")
-def endpoint_years(db: Session = Depends(get_db)):
-    years = db_service.get_years(db)
+async def endpoint_years(db: AsyncSession = Depends(get_async_db)):
+    years = await async_db_service.get_years(db)
     return {"years": years}
 
 @router.get("/profundidades")
-def endpoint_depths():
-    depths = db_service.get_depths()
+async def endpoint_depths(db: AsyncSession = Depends(get_async_db)):
+    depths = await async_db_service.get_depths(db)
     return {"exito": True, "profundidades": depths}
 
 @router.get("/profundidad/{valor}")
-def endpoint_by_depth(valor: float, db: Session = Depends(get_db)):
-    rows = db_service.get_by_depth(db, valor)
+async def endpoint_by_depth(
+    valor: float,
+    render: str = RENDER_QUERY,
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if render == "db":
+        count, features_json = await async_db_service.get_by_depth_json(db, valor, area)
+        return json_bytes_response(raw_feature_collection(
+            features_json, exito=True, count=count, type="FeatureCollection"
+        ))
+
+    rows = await async_db_service.get_by_depth(db, valor, area)
 
     if not rows:
-        return {
+        return ORJSONResponse({
             "exito": True,
             "count": 0,
             "type": "FeatureCollection",
             "features": []
-        }
+        })
 
     # Convertimos a GeoJSON (usando tu utilitario)
     features = features_to_geojson_from_db(rows)
 
-    return {
+    return ORJSONResponse({
         "exito": True,
         "count": len(features),
         "type": "FeatureCollection",
         "features": features
-    }
+    })
 
 @router.get("/estacion/{nombre}/profundidades")
-def endpoint_station_depths(nombre: str, db: Session = Depends(get_db)):
-    depths = db_service.get_depths_by_station(db, nombre)
+async def endpoint_station_depths(nombre: str, db: AsyncSession = Depends(get_async_db)):
+    depths = await async_db_service.get_depths_by_station(db, nombre)
 
     return {
         "exito": True,
@@ -79,23 +148,33 @@ def endpoint_station_depths(nombre: str, db: Session = Depends(get_db)):
 
 
 @router.get("/filtrar")
-def endpoint_data_by_year_station(
+async def endpoint_data_by_year_station(
     station: str,
     year: int,
-    db: Session = Depends(get_db)
+    render: str = RENDER_QUERY,
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    rows = db_service.get_by_year_and_station(db, year, station)
-    return {
+    if render == "db":
+        count, features_json = await async_db_service.get_by_year_and_station_json(
+            db, year, station, area
+        )
+        return json_bytes_response(raw_feature_collection(
+            features_json, exito=True, station=station, year=year, total=count
+        ))
+
+    rows = await async_db_service.get_by_year_and_station(db, year, station, area)
+    return ORJSONResponse({
         "exito": True,
         "station": station,
         "year": year,
         "total": len(rows),
         "features": features_to_geojson_from_db(rows)
-    }
+    })
 
 @router.get("/years/{station}")
-def endpoint_years_by_station(station: str, db: Session = Depends(get_db)):
-    years = db_service.get_years_by_station(db, station)
+async def endpoint_years_by_station(station: str, db: AsyncSession = Depends(get_async_db)):
+    years = await async_db_service.get_years_by_station(db, station)
     return {
         "station": station,
         "total_years": len(years),
@@ -103,145 +182,495 @@ def endpoint_years_by_station(station: str, db: Session = Depends(get_db)):
     }
 
 @router.get("/mediciones/por-anio/{year}")
-def endpoint_measurements_by_year(
+async def endpoint_measurements_by_year(
     year: int,
     page: int = 1,
     limit: int = 200,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Token next_cursor de la página anterior"),
+    total: str = Query("exact", regex="^(exact|estimate|none)$"),
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total, rows = db_service.get_measurements_by_year(db, year, page, limit)
+    after_id = None
+    if cursor:
+        values = decode_cursor(cursor)
+        if values.get("year") != year or not isinstance(values.get("id"), int):
+            raise HTTPException(status_code=400, detail="Cursor inválido para este año")
+        after_id = values["id"]
+
+    total_registros, rows = await async_db_service.get_measurements_by_year(
+        db, year, page, limit, after_id=after_id, total_mode=total, area=area
+    )
 
-    return {
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(year=year, id=rows[-1].id)
+
+    return ORJSONResponse({
         "exito": True,
         "year": year,
         "page": page,
         "limit": limit,
-        "total_registros": total,
-        "total_paginas": (total // limit) + 1,
+        "total_registros": total_registros,
+        "total_paginas": (total_registros // limit) + 1 if total_registros is not None else None,
+        "next_cursor": next_cursor,
         "features": features_to_geojson_from_db(rows)
-    }
+    })
 
 @router.get("/estaciones/por-anio/{year}")
-def endpoint_first_records_by_year(
+async def endpoint_first_records_by_year(
     year: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    rows = db_service.get_first_records_by_year(db, year)
+    rows = await async_db_service.get_first_records_by_year(db, year)
 
     features = features_to_geojson_from_db(rows)
 
-    return {
+    return ORJSONResponse({
         "exito": True,
         "year": year,
         "total": len(features),
         "type": "FeatureCollection",
         "features": features
-    }
+    })
+
+@router.get("/estaciones/cercanas")
+async def endpoint_nearest_stations(
+    lon: float = Query(..., ge=-180, le=180),
+    lat: float = Query(..., ge=-90, le=90),
+    k: int = Query(5, ge=1, le=100),
+    year: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Las k estaciones más cercanas al punto (distancia en metros)."""
+    rows = await async_db_service.get_nearest_stations(db, lon, lat, k, year)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [r.longitud, r.latitud]},
+            "properties": {
+                "estacion": r.estacion,
+                "registros": r.registros,
+                "distancia_m": round(r.distancia_m, 1),
+            },
+        }
+        for r in rows
+    ]
+    return ORJSONResponse({
+        "exito": True,
+        "total": len(features),
+        "type": "FeatureCollection",
+        "features": features
+    })
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+@router.get("/mediciones/grilla/{year}")
+async def endpoint_grid_aggregate(
+    year: int,
+    zoom: int = Query(4, ge=0, le=20, description="Nivel de zoom del mapa"),
+    cell_deg: Optional[float] = Query(None, gt=0, le=45, description="Tamaño de celda en grados (reemplaza zoom)"),
+    station: Optional[str] = None,
+    prof_min: Optional[float] = None,
+    prof_max: Optional[float] = None,
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Mediciones del año agregadas por celda para el mapa: un punto por celda
+    (centroide) con el conteo y las medias. La cache de respuestas la
+    guarda por filtro + zoom hasta la próxima carga del ETL.
+    """
+    size = cell_deg or zoom_cell_deg(zoom)
+    rows = await async_db_service.get_grid_aggregate(
+        db, year, size,
+        station=station, depth_min=prof_min, depth_max=prof_max, area=area,
+    )
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [r.longitud, r.latitud]},
+            "properties": {
+                "celda": [int(r.ix), int(r.iy)],
+                "registros": r.registros,
+                "temperatura": _round(r.temperatura),
+                "salinidad": _round(r.salinidad),
+                "oxigeno": _round(r.oxigeno),
+            },
+        }
+        for r in rows
+    ]
+    return ORJSONResponse({
+        "exito": True,
+        "year": year,
+        "cell_deg": size,
+        "total_registros": sum(r.registros for r in rows),
+        "total": len(features),
+        "type": "FeatureCollection",
+        "features": features
+    })
+
+def series_resolution(date_from: Optional[datetime], date_to: Optional[datetime]) -> str:
+    """resolution=auto: crudo hasta un mes, diario hasta dos años, si no mensual."""
+    days = (date_to - date_from).days
+    if days <= 31:
+        return "raw"
+    if days <= 731:
+        return "day"
+    return "month"
+
+@router.get("/series")
+async def endpoint_series(
+    station: str,
+    variable: str = Query("temperatura", regex="^(temperatura|salinidad|oxigeno)$"),
+    resolution: str = Query("auto", regex="^(auto|raw|day|month)$"),
+    profundidad: Optional[float] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    max_points: int = Query(500, ge=3, le=10000, description="Puntos tras el downsampling (LTTB)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Serie temporal de una variable en la estación, desde los rollups diarios
+    / mensuales (o las mediciones con resolution=raw), reducida con LTTB a
+    `max_points` puntos como máximo.
+    """
+    # `fecha` es UTC sin zona: desde/hasta con offset o Z se llevan a lo mismo
+    desde, hasta = to_naive_utc(desde), to_naive_utc(hasta)
+    if resolution in ("auto", "raw"):
+        first, last = await async_db_service.get_series_span(db, station)
+        if resolution == "auto":
+            if first is None:
+                resolution = "day"
+            else:
+                resolution = series_resolution(desde or first, hasta or datetime(last.year + 1, 1, 1))
+        elif first is not None:
+            # crudo solo en ventanas acotadas: se lee todo antes del LTTB;
+            # `last` es el inicio del último mes con datos
+            days = ((hasta or next_period(last, "month")) - (desde or first)).days
+            if days > settings.series_raw_max_days:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"resolution=raw admite hasta {settings.series_raw_max_days} días; "
+                           "acote desde/hasta o use day / month",
+                )
+
+    limit = settings.series_raw_max_rows + 1 if resolution == "raw" else None
+    rows = await async_db_service.get_series(
+        db, station, variable, resolution,
+        depth=profundidad, date_from=desde, date_to=hasta, limit=limit,
+    )
+    if limit is not None and len(rows) >= limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Más de {settings.series_raw_max_rows} puntos crudos; acote desde/hasta o use day / month",
+        )
+    if len(rows) > max_points:
+        x = [r.fecha.timestamp() for r in rows]
+        rows = [rows[i] for i in lttb(x, [r.media for r in rows], max_points)]
+
+    return ORJSONResponse({
+        "exito": True,
+        "estacion": station,
+        "variable": variable,
+        "profundidad": profundidad,
+        "resolution": resolution,
+        "total": len(rows),
+        "series": [
+            {
+                "fecha": r.fecha.strftime("%Y-%m-%d %H:%M:%S"),
+                "media": r.media,
+                "min": r.min,
+                "max": r.max,
+                "registros": r.registros,
+            }
+            for r in rows
+        ]
+    })
+
+@router.get("/perfil")
+async def endpoint_depth_profile(
+    station: Optional[str] = None,
+    year: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    niveles: Optional[str] = Query(None, description="Profundidades estándar separadas por coma"),
+    cast_por: str = Query("dia", regex="^(dia|fecha)$", description="Agrupar lances por día o fecha exacta"),
+    umbral: float = Query(0.2, gt=0, description="Umbral de temperatura (°C) para la capa de mezcla"),
+    referencia: float = Query(10.0, ge=0, description="Profundidad de referencia (m) para la capa de mezcla"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Perfiles verticales de temperatura, salinidad y oxígeno interpolados en
+    niveles estándar para cada lance del corte (estación / año / fechas),
+    con la profundidad de la capa de mezcla y el perfil medio.
+    """
+    try:
+        levels = parse_levels(niveles) if niveles else STANDARD_LEVELS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Niveles inválidos: {e}")
+
+    desde, hasta = to_naive_utc(desde), to_naive_utc(hasta)
+    if station is None and year is None and (desde is None or hasta is None):
+        raise HTTPException(status_code=400, detail="Indique station, year o desde y hasta")
+
+    limit = settings.perfil_max_rows + 1
+    rows = await async_db_service.get_profile_slice(
+        db, station=station, year=year, date_from=desde, date_to=hasta, cast_by=cast_por, limit=limit
+    )
+    if len(rows) >= limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Más de {settings.perfil_max_rows} mediciones en el corte; acótelo por estación, año o fechas",
+        )
+    # los lances se cuentan antes de armar las matrices (lances x muestras x niveles)
+    n_casts = len({(r[0], r[1]) for r in rows})
+    if n_casts > settings.perfil_max_casts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{n_casts} lances en el corte (máximo {settings.perfil_max_casts}); acótelo por estación, año o fechas",
+        )
+    keys, stations, values, mld, max_depth = build_profiles(rows, levels, umbral, referencia)
+
+    columns = {var: values[var].tolist() for var in VARIABLES}
+    mld_list = mld.tolist()
+    max_depth_list = max_depth.tolist()
+    casts = [
+        {
+            "estacion": stations[i],
+            "fecha": keys[i].strftime("%Y-%m-%d %H:%M:%S"),
+            "profundidad_max": max_depth_list[i],
+            "capa_mezcla_m": mld_list[i],
+            **{var: columns[var][i] for var in VARIABLES},
+        }
+        for i in range(len(keys))
+    ]
+    return ORJSONResponse({
+        "exito": True,
+        "station": station,
+        "niveles": list(levels),
+        "total": len(casts),
+        "media": {var: mean_profile(values[var]).tolist() for var in VARIABLES},
+        "lances": casts
+    })
 
 @router.get("/por-anio-y-estacion")
-def endpoint_by_year_and_station(
+async def endpoint_by_year_and_station(
     year: int,
     station: str,
-    db: Session = Depends(get_db)
+    render: str = RENDER_QUERY,
+    area = Depends(spatial_area),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    rows = db_service.get_records_by_year_and_station(db, year, station)
+    if render == "db":
+        count, features_json = await async_db_service.get_records_by_year_and_station_json(
+            db, year, station, area
+        )
+        return json_bytes_response(raw_feature_collection(
+            features_json, exito=True, year=year, station=station,
+            total=count, type="FeatureCollection"
+        ))
+
+    rows = await async_db_service.get_records_by_year_and_station(db, year, station, area)
 
     if not rows:
-        return {
+        return ORJSONResponse({
             "exito": True,
             "year": year,
             "station": station,
             "total": 0,
             "type": "FeatureCollection",
             "features": []
-        }
+        })
 
     features = features_to_geojson_from_db(rows)
 
-    return {
+    return ORJSONResponse({
         "exito": True,
         "year": year,
         "station": station,
         "total": len(features),
         "type": "FeatureCollection",
         "features": features
-    }
+    })
 
 
+# media types de los formatos de /mediciones/anio/{year}
+STREAM_MEDIA_TYPES = {
+    "geojson": "application/json",
+    "geojsonseq": "application/geo+json-seq",
+    "ndjson": "application/x-ndjson",
+}
+
 @router.get("/mediciones/anio/{year}")
-def endpoint_measurements_by_year_chunked(
+async def endpoint_measurements_by_year_chunked(
     year: int,
-    db: Session = Depends(get_db),
-    block_size: int = 800
+    db: AsyncSession = Depends(get_async_db),
+    block_size: int = 800,
+    formato: str = Query("geojson", regex="^(geojson|geojsonseq|ndjson)$"),
+    render: str = RENDER_QUERY,
+    area = Depends(spatial_area)
 ):
+    # Cada bloque se serializa y se envía apenas sale de la base
+    if render == "db":
+        chunks = async_db_service.stream_measurements_by_year_json(db, year, block_size, area)
+    else:
+        chunks = (
+            features_to_geojson_from_db(chunk)
+            async for chunk in async_db_service.stream_measurements_by_year(
+                db, year, block_size, area
+            )
+        )
+
+    if formato == "geojson":
+        body = stream_feature_collection(
+            chunks, exito=True, year=year, block_size=block_size
+        )
+    else:
+        body = stream_feature_sequence(chunks, record_separator=(formato == "geojsonseq"))
+
+    return StreamingResponse(body, media_type=STREAM_MEDIA_TYPES[formato])
+
+# Formatos columnares para análisis (pandas / polars / arrow)
+EXPORT_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "columnar": "application/json",
+}
+
+@router.get("/mediciones/exportar/{year}")
+async def endpoint_export_columnar(
+    year: int,
+    formato: str = Query("arrow", regex="^(arrow|parquet|columnar)$"),
+    station: Optional[str] = None,
+    block_size: int = Query(5000, ge=1, le=50000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if formato != "columnar":
+        # antes de enviar los encabezados: sin pyarrow responde 501, no un 200 cortado
+        require_pyarrow()
+    if station is None:
+        blocks = async_db_service.stream_measurements_by_year(db, year, block_size)
+    else:
+        blocks = async_db_service.stream_measurements_by_year_and_station(db, year, station, block_size)
+
+    if formato == "columnar":
+        return json_bytes_response(await columnar_json(blocks))
+
+    suffix = f"_{station}" if station else ""
+    extension = "arrow" if formato == "arrow" else "parquet"
+    body = stream_arrow(blocks) if formato == "arrow" else stream_parquet(blocks)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[formato],
+        headers={
+            "Content-Disposition": f"attachment; filename=mediciones_{year}{suffix}.{extension}"
+        }
+    )
 
-    all_features = []
-    total = 0
-
-    for chunk in db_service.stream_measurements_by_year(db, year, block_size):
-        features = features_to_geojson_from_db(chunk)
-        all_features.extend(features)
-        total += len(features)
+@router.get("/mediciones/csv")
+def download_csv(
+    year: Optional[int] = None,
+    station: Optional[str] = None,
+    prof_min: Optional[float] = None,
+    prof_max: Optional[float] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    gzip: bool = False
+):
+    """
+    CSV de `mediciones` generado por Postgres con COPY ... TO STDOUT.
+    Filtros opcionales por año, estación, rango de profundidad y rango de
+    fechas [desde, hasta). Con gzip=true se envía comprimido.
+    """
+    stmt = export_service.csv_export_stmt(
+        year=year, station=station,
+        depth_min=prof_min, depth_max=prof_max,
+        date_from=desde, date_to=hasta,
+    )
+    filename = "mediciones" + (f"_{year}" if year else "") + (f"_{station}" if station else "")
+    filename += ".csv.gz" if gzip else ".csv"
+    return StreamingResponse(
+        export_service.stream_copy_csv(stmt, compress=gzip),
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
-    return {
-        "exito": True,
-        "year": year,
-        "block_size": block_size,
-        "total_registros": total,
-        "type": "FeatureCollection",
-        "features": all_features
-    }
+EXCEL_HEADERS = [
+    "OBJECTID", "GLOBALID", "ESTACION", "FECHA", "PROFUNDIDAD",
+    "TEMPERATURA", "SALINIDAD", "OXIGENO",
+    "LONGITUD", "LATITUD"
+]
 
+# Síncrono a propósito: openpyxl escribe a disco de forma bloqueante, así
+# que corre en el threadpool con la sesión psycopg2 y cursor del servidor.
 @router.get("/mediciones/descargar-excel-estaciones/{year}")
 def download_excel_by_year_grouped(
     year: int,
     db: Session = Depends(get_db)
 ):
-    wb = Workbook()
-    wb.remove(wb.active)  # Quitamos la hoja por defecto
-
     # Obtener todas las estaciones del año
     stations = db_service.get_stations_by_year(db, year)
 
     if not stations:
         raise HTTPException(404, "No hay datos para ese año")
 
-    # Crear una hoja por estación
-    for station in stations:
-        ws = wb.create_sheet(title=str(station)[:31])  # Excel limita a 31 caracteres
+    # Libro en modo write_only: las filas se escriben a disco a medida que
+    # llegan, sin mantener todas las celdas en memoria
+    wb = Workbook(write_only=True)
 
-        # Encabezados
+    def new_sheet(station):
+        ws = wb.create_sheet(title=str(station)[:31])  # Excel limita a 31 caracteres
+        ws.append(EXCEL_HEADERS)
+        return ws
+
+    # Un solo recorrido ordenado por estación: se cambia de hoja en cada corte.
+    # Ambas consultas ordenan por estación en Postgres, así las estaciones sin
+    # filas (coordenadas inválidas) se intercalan en el orden de `stations`
+    position = {station: i for i, station in enumerate(stations)}
+    next_index = 0
+    ws = None
+    current = None
+    for r in db_service.iter_measurements_by_year_ordered_by_station(db, year):
+        if r.estacion != current:
+            current = r.estacion
+            index = position.get(current)
+            if index is not None and index >= next_index:
+                # hojas solo con encabezados de las estaciones salteadas
+                for station in stations[next_index:index]:
+                    new_sheet(station)
+                next_index = index + 1
+            ws = new_sheet(current)
         ws.append([
-            "OBJECTID", "GLOBALID", "ESTACION", "FECHA", "PROFUNDIDAD",
-            "TEMPERATURA", "SALINIDAD", "OXIGENO",
-            "LONGITUD", "LATITUD"
+            r.objectid,
+            r.globalid,
+            r.estacion,
+            r.fecha.strftime("%Y-%m-%d %H:%M:%S") if r.fecha else None,
+            r.profundidad,
+            r.temperatura,
+            r.salinidad,
+            r.oxigeno,
+            r.longitud,
+            r.latitud,
         ])
 
-        # Datos por bloques para la estación actual
-        for chunk in db_service.stream_measurements_by_year_and_station(db, year, station):
-            for r in chunk:
-                ws.append([
-                    r.objectid,
-                    r.globalid,
-                    r.estacion,
-                    r.fecha.strftime("%Y-%m-%d %H:%M:%S") if r.fecha else None,
-                    r.profundidad,
-                    r.temperatura,
-                    r.salinidad,
-                    r.oxigeno,
-                    r.longitud,
-                    r.latitud,
-                ])
-
-    # Guardar en memoria
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    return StreamingResponse(
-        output,
+    # Estaciones sin filas al final del orden: hoja solo con encabezados
+    for station in stations[next_index:]:
+        new_sheet(station)
+
+    # Guardar en un archivo temporal que se envía por partes y luego se borra
+    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    tmp.close()
+    try:
+        wb.save(tmp.name)
+    except Exception:
+        os.remove(tmp.name)
+        raise
+
+    return FileResponse(
+        tmp.name,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": f"attachment; filename=iCEMAN_estaciones_{year}.xlsx"
-        }
+        filename=f"iCEMAN_estaciones_{year}.xlsx",
+        background=BackgroundTask(os.remove, tmp.name)
     )
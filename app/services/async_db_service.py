@@ -0,0 +1,165 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.db_service import (
+    by_station_stmt,
+    all_stations_stmt,
+    by_objectid_stmt,
+    years_stmt,
+    depths_stmt,
+    by_depth_stmt,
+    depths_by_station_stmt,
+    by_year_and_station_stmt,
+    years_by_station_stmt,
+    measurements_by_year_stmt,
+    count_stmt,
+    explain_stmt,
+    plan_rows,
+    measurements_page_stmt,
+    first_records_by_year_stmt,
+    records_by_year_and_station_stmt,
+    year_block_stmt,
+    stations_by_year_stmt,
+    feature_collection_json_stmt,
+    year_block_json_stmt,
+    nearest_stations_stmt,
+    grid_aggregate_stmt,
+    series_stmt,
+    series_span_stmt,
+    profile_stmt,
+)
+
+# Versión asyncio (asyncpg) de las consultas de app.services.db_service
+# para la API de lectura; las sentencias son las mismas.
+
+async def _scalars(db: AsyncSession, stmt):
+    return (await db.execute(stmt)).scalars().all()
+
+async def _rows(db: AsyncSession, stmt):
+    """Filas como tuplas con nombre (Row), sin hidratar objetos ORM."""
+    return (await db.execute(stmt)).all()
+
+async def get_by_station(
+    db: AsyncSession, station: str, limit: int = 100, offset: int = 0, area=None
+):
+    return await _rows(db, by_station_stmt(station, limit, offset, area))
+
+async def get_all_stations(db: AsyncSession):
+    return await _scalars(db, all_stations_stmt())
+
+async def get_by_objectid(db: AsyncSession, objectid: int):
+    return (await db.execute(by_objectid_stmt(objectid))).first()
+
+async def get_years(db: AsyncSession):
+    return await _scalars(db, years_stmt())
+
+async def get_depths(db: AsyncSession):
+    return await _scalars(db, depths_stmt())
+
+async def get_by_depth(db: AsyncSession, depth: float, area=None):
+    return await _rows(db, by_depth_stmt(depth, area))
+
+async def get_depths_by_station(db: AsyncSession, station: str):
+    return await _scalars(db, depths_by_station_stmt(station))
+
+async def get_by_year_and_station(db: AsyncSession, year: int, station: str, area=None):
+    return await _rows(db, by_year_and_station_stmt(year, station, area))
+
+async def get_years_by_station(db: AsyncSession, station: str):
+    return await _scalars(db, years_by_station_stmt(station))
+
+async def get_measurements_by_year(
+    db: AsyncSession,
+    year: int,
+    page: int,
+    limit: int,
+    after_id: int | None = None,
+    total_mode: str = "exact",
+    area=None,
+):
+    if total_mode == "exact":
+        total = (await db.execute(count_stmt(measurements_by_year_stmt(year, area)))).scalar()
+    elif total_mode == "estimate":
+        total = plan_rows(
+            (await db.execute(explain_stmt(measurements_by_year_stmt(year, area)))).scalar()
+        )
+    else:
+        total = None
+
+    rows = await _rows(db, measurements_page_stmt(year, page, limit, after_id, area))
+    return total, rows
+
+async def get_first_records_by_year(db: AsyncSession, year: int):
+    return await _rows(db, first_records_by_year_stmt(year))
+
+async def get_records_by_year_and_station(
+    db: AsyncSession, year: int, station: str, area=None
+):
+    return await _rows(db, records_by_year_and_station_stmt(year, station, area))
+
+async def stream_measurements_by_year(
+    db: AsyncSession, year: int, block_size: int = 800, area=None
+):
+    last_id = 0
+    while True:
+        rows = await _rows(db, year_block_stmt(year, last_id, block_size, area=area))
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1].id
+
+async def get_stations_by_year(db: AsyncSession, year: int):
+    return await _scalars(db, stations_by_year_stmt(year))
+
+async def stream_measurements_by_year_and_station(
+    db: AsyncSession, year: int, station: str, block_size: int = 500
+):
+    last_id = 0
+    while True:
+        rows = await _rows(db, year_block_stmt(year, last_id, block_size, station))
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1].id
+
+async def get_nearest_stations(
+    db: AsyncSession, lon: float, lat: float, k: int = 5, year: int | None = None
+):
+    return await _rows(db, nearest_stations_stmt(lon, lat, k, year))
+
+async def get_grid_aggregate(db: AsyncSession, year: int, cell_deg: float, **filters):
+    return await _rows(db, grid_aggregate_stmt(year, cell_deg, **filters))
+
+async def get_series(db: AsyncSession, station: str, variable: str, resolution: str, **filters):
+    return await _rows(db, series_stmt(station, variable, resolution, **filters))
+
+async def get_series_span(db: AsyncSession, station: str):
+    return (await db.execute(series_span_stmt(station))).one()
+
+async def get_profile_slice(db: AsyncSession, **filters):
+    return await _rows(db, profile_stmt(**filters))
+
+# GeoJSON armado por Postgres: devuelven texto JSON listo para enviar
+
+async def get_by_depth_json(db: AsyncSession, depth: float, area=None):
+    stmt = by_depth_stmt(depth, area)
+    return (await db.execute(feature_collection_json_stmt(stmt, "fecha", "id"))).one()
+
+async def get_by_year_and_station_json(db: AsyncSession, year: int, station: str, area=None):
+    stmt = by_year_and_station_stmt(year, station, area)
+    return (await db.execute(feature_collection_json_stmt(stmt, "fecha", "id"))).one()
+
+async def get_records_by_year_and_station_json(
+    db: AsyncSession, year: int, station: str, area=None
+):
+    stmt = records_by_year_and_station_stmt(year, station, area)
+    return (await db.execute(feature_collection_json_stmt(stmt, "estacion", "fecha", "id"))).one()
+
+async def stream_measurements_by_year_json(
+    db: AsyncSession, year: int, block_size: int = 800, area=None
+):
+    last_id = 0
+    while True:
+        rows = (await db.execute(year_block_json_stmt(year, last_id, block_size, area))).all()
+        if not rows:
+            break
+        yield [r[1] for r in rows]
+        last_id = rows[-1][0]
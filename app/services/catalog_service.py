@@ -0,0 +1,40 @@
+from sqlalchemy import select, insert, delete, func, case, and_, Integer
+from app.models import Medicion, CatalogoEstacionAnio, CatalogoProfundidad
+
+# Los catálogos (estaciones, años, profundidades) se recalculan con un
+# GROUP BY después de cada carga con cambios, dentro de la misma transacción
+# del ETL; los endpoints de catálogo leen estas tablas en lugar de hacer
+# SELECT DISTINCT sobre `mediciones`.
+
+def _valid():
+    return and_(Medicion.longitud != -99999, Medicion.latitud != -99999)
+
+def _geo_count():
+    return func.count(case((_valid(), 1)))
+
+def refresh_catalog(session):
+    anio = func.extract("year", Medicion.fecha).cast(Integer)
+    session.execute(delete(CatalogoEstacionAnio))
+    session.execute(
+        insert(CatalogoEstacionAnio).from_select(
+            ["estacion", "anio", "registros", "registros_geo", "longitud", "latitud"],
+            select(
+                Medicion.estacion, anio, func.count(), _geo_count(),
+                func.avg(case((_valid(), Medicion.longitud))),
+                func.avg(case((_valid(), Medicion.latitud))),
+            )
+            .group_by(Medicion.estacion, anio),
+        )
+    )
+
+    session.execute(delete(CatalogoProfundidad))
+    session.execute(
+        insert(CatalogoProfundidad).from_select(
+            ["estacion", "profundidad", "registros", "registros_geo"],
+            select(Medicion.estacion, Medicion.profundidad, func.count(), _geo_count())
+            .group_by(Medicion.estacion, Medicion.profundidad),
+        )
+    )
+
+def catalog_is_empty(session) -> bool:
+    return session.query(CatalogoEstacionAnio.id).first() is None
@@ -1,317 +1,676 @@
-import requests
+import asyncio
+import json
 import httpx
-import os
-from datetime import datetime, timezone
-from typing import List, Dict, Any
-from app.db import SessionLocal
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from app.db import AsyncSessionLocal
 from fastapi import HTTPException
-from app.models import Medicion
-from sqlalchemy import select, func, extract, and_, distinct
+from app.models import (
+    Medicion, CatalogoEstacionAnio, CatalogoProfundidad, SerieDiaria, SerieMensual
+)
+from sqlalchemy import select, func, and_, or_, true, false, text, case, cast, literal_column, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from app.core.config import settings
-
-def get_by_station(station: str, limit: int = 100, offset: int = 0):
-    session = SessionLocal()
-    try:
-        q = select(Medicion).where(Medicion.estacion == station).limit(limit).offset(offset)
-        rows = session.execute(q).scalars().all()
-        return rows
-    finally:
-        session.close()
-
-def get_all_stations(db):
-    rows = (
-        db.query(Medicion.estacion)
-        .filter(Medicion.estacion.isnot(None))
-        .distinct()
-        .order_by(Medicion.estacion)
-        .all()
+from app.core.cache import TTLCache
+from app.core.arcgis_client import get_arcgis_client, ArcGISQueryError, CircuitOpenError
+from app.utils.geojson_converter import features_to_arcgis_geojson_from_db
+from app.utils.geo import BBox, Near, EARTH_RADIUS_M
+from app.services.rollup_service import period_start
+
+# Las consultas se definen como sentencias select() (funciones *_stmt). Las
+# ejecuta app.services.async_db_service (AsyncSession / asyncpg, usada por
+# la API de lectura); aquí quedan solo las versiones síncronas que usa la
+# exportación a Excel (Session / psycopg2).
+
+def year_range(year: int):
+    """
+    Filtro "fecha dentro del año" como rango semiabierto
+    [year-01-01, year+1-01-01), que sí puede usar los índices sobre fecha
+    (extract('year', fecha) == year obliga a recorrer toda la tabla).
+    """
+    if not 1 <= year < 9999:
+        return false()
+    return and_(
+        Medicion.fecha >= datetime(year, 1, 1),
+        Medicion.fecha < datetime(year + 1, 1, 1),
     )
-    return [r[0] for r in rows]  # extrae solo el string
-
 
-def get_by_objectid(objectid: int):
-    session = SessionLocal()
-    try:
-        return session.query(Medicion).filter(Medicion.objectid==objectid).first()
-    finally:
-        session.close()
-
-def get_years(db):
-    rows = (
-        db.query(func.extract("year", Medicion.fecha).label("year"))
-        .filter(Medicion.fecha.isnot(None))
-        .distinct()
-        .all()
+# Columnas que usan los serializadores de features: se seleccionan como
+# tuplas (Row) en lugar de instancias ORM para evitar la hidratación y el
+# identity map en los listados grandes.
+FEATURE_COLUMNS = (
+    Medicion.id,
+    Medicion.objectid,
+    Medicion.globalid,
+    Medicion.estacion,
+    Medicion.fecha,
+    Medicion.longitud,
+    Medicion.latitud,
+    Medicion.profundidad,
+    Medicion.temperatura,
+    Medicion.salinidad,
+    Medicion.oxigeno,
+    Medicion.created_date_ms,
+    Medicion.last_edited_date_ms,
+)
+
+def valid_coords():
+    return and_(Medicion.longitud != -99999, Medicion.latitud != -99999)
+
+def distance_m(lon_col, lat_col, lon: float, lat: float):
+    """Distancia haversine en metros entre (lon_col, lat_col) y el punto dado."""
+    dlat = func.radians(lat_col - lat) / 2
+    dlon = func.radians(lon_col - lon) / 2
+    a = (
+        func.power(func.sin(dlat), 2)
+        + func.cos(func.radians(lat)) * func.cos(func.radians(lat_col)) * func.power(func.sin(dlon), 2)
     )
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(func.least(a, 1.0)))
 
-    years = []
-    for r in rows:
-        year_value = r.year
-
-        # evitar None
-        if year_value is None:
-            continue
-
-        # evitar años erróneos
-        try:
-            y = int(year_value)
-            if 1900 <= y <= 2100:
-                years.append(y)
-        except:
-            continue
+def spatial_filter(area: BBox | Near | None):
+    """
+    Filtro por bbox o por radio. Los rangos de `celda` permiten usar el
+    índice btree; el filtro exacto por lon/lat (y la distancia haversine en
+    el caso de radio) descarta lo que cae en los bordes de las celdas.
+    """
+    if area is None:
+        return true()
+    bbox = area.bbox() if isinstance(area, Near) else area
+    criteria = and_(
+        or_(*(Medicion.celda.between(a, b) for a, b in bbox.cell_ranges())),
+        or_(*(Medicion.longitud.between(a, b) for a, b in bbox.lon_spans())),
+        Medicion.latitud.between(bbox.min_lat, bbox.max_lat),
+    )
+    if isinstance(area, Near):
+        criteria = and_(
+            criteria,
+            distance_m(Medicion.longitud, Medicion.latitud, area.lon, area.lat) <= area.radius_m,
+        )
+    return criteria
 
-    return sorted(set(years))
+# ---------------------------------------------------------------------------
+# Sentencias
+# ---------------------------------------------------------------------------
 
+def by_station_stmt(station: str, limit: int = 100, offset: int = 0, area=None):
+    return (
+        select(*FEATURE_COLUMNS)
+        .where(Medicion.estacion == station)
+        .where(spatial_filter(area))
+        .limit(limit)
+        .offset(offset)
+    )
 
-    # 2. Filtrar cualquier None que escape y convertir a entero
-    years = []
-    for r in rows:
-        if r.year is not None:
-            try:
-                years.append(int(r.year))
-            except:
-                continue
+def all_stations_stmt():
+    return (
+        select(CatalogoEstacionAnio.estacion)
+        .where(CatalogoEstacionAnio.estacion.isnot(None))
+        .distinct()
+        .order_by(CatalogoEstacionAnio.estacion)
+    )
 
-    return sorted(list(set(years)))
+def by_objectid_stmt(objectid: int):
+    return select(*FEATURE_COLUMNS).where(Medicion.objectid == objectid).limit(1)
 
-def get_depths():
-    session = SessionLocal()
-    try:
-        q = session.query(Medicion.profundidad).distinct().order_by(Medicion.profundidad)
-        rows = q.all()
-        return [r[0] for r in rows if r[0] is not None]
-    finally:
-        session.close()
-
-def get_by_depth(db, depth: float):
-    rows = (
-        db.query(Medicion)
-        .filter(Medicion.profundidad == depth)
-        .order_by(Medicion.fecha.asc())
-        .all()
+def years_stmt():
+    return (
+        select(CatalogoEstacionAnio.anio)
+        .where(CatalogoEstacionAnio.anio.between(1900, 2100))  # evitar años erróneos
+        .distinct()
+        .order_by(CatalogoEstacionAnio.anio)
     )
-    return rows
-
-def get_depths_by_station(db, station: str):
-    rows = (
-        db.query(Medicion.profundidad)
-        .filter(Medicion.longitud != -99999)
-        .filter(Medicion.latitud != -99999)
-        .filter(Medicion.estacion == station)
-        .filter(Medicion.profundidad.isnot(None))   # evita NULL
+
+def depths_stmt():
+    return (
+        select(CatalogoProfundidad.profundidad)
+        .where(CatalogoProfundidad.profundidad.isnot(None))
         .distinct()
-        .order_by(Medicion.profundidad.asc())
-        .all()
+        .order_by(CatalogoProfundidad.profundidad)
     )
 
-    return [r[0] for r in rows]
+def by_depth_stmt(depth: float, area=None):
+    return (
+        select(*FEATURE_COLUMNS)
+        .where(Medicion.profundidad == depth)
+        .where(spatial_filter(area))
+        .order_by(Medicion.fecha.asc())
+    )
 
+def depths_by_station_stmt(station: str):
+    return (
+        select(CatalogoProfundidad.profundidad)
+        .where(CatalogoProfundidad.estacion == station)
+        .where(CatalogoProfundidad.registros_geo > 0)  # solo con coordenadas válidas
+        .where(CatalogoProfundidad.profundidad.isnot(None))   # evita NULL
+        .order_by(CatalogoProfundidad.profundidad.asc())
+    )
 
-def get_by_year_and_station(db, year: int, station: str):
+def by_year_and_station_stmt(year: int, station: str, area=None):
     return (
-        db.query(Medicion)
-        .filter(Medicion.estacion == station)
-        .filter(extract('year', Medicion.fecha) == year)
-        .filter(Medicion.longitud != -99999)
-        .filter(Medicion.latitud != -99999)
+        select(*FEATURE_COLUMNS)
+        .where(Medicion.estacion == station)
+        .where(year_range(year))
+        .where(valid_coords())
+        .where(spatial_filter(area))
         .order_by(Medicion.fecha.asc())
-        .all()
     )
 
-def get_years_by_station(db, station: str):
-    rows = (
-        db.query(extract("year", Medicion.fecha).label("year"))
-        .filter(Medicion.estacion == station)
-        .filter(Medicion.fecha.isnot(None))
-        .distinct()
-        .all()
+def years_by_station_stmt(station: str):
+    return (
+        select(CatalogoEstacionAnio.anio)
+        .where(CatalogoEstacionAnio.estacion == station)
+        .where(CatalogoEstacionAnio.anio.between(1900, 2100))
+        .order_by(CatalogoEstacionAnio.anio)
     )
 
-    years = []
-    for r in rows:
-        try:
-            y = int(r.year)
-            if 1900 <= y <= 2100:
-                years.append(y)
-        except:
-            continue
-
-    return sorted(set(years))
-
-def get_measurements_by_year(db, year: int, page: int, limit: int):
-    offset = (page - 1) * limit
-
-    query = (
-        db.query(Medicion)
-        .filter(func.extract('year', Medicion.fecha) == year)
-        .filter(Medicion.longitud != -99999)
-        .filter(Medicion.latitud != -99999)
+def measurements_by_year_stmt(year: int, area=None):
+    return (
+        select(*FEATURE_COLUMNS)
+        .where(year_range(year))
+        .where(valid_coords())
+        .where(spatial_filter(area))
     )
 
-    total = query.count()
+def count_stmt(stmt):
+    return select(func.count()).select_from(stmt.order_by(None).subquery())
 
-    rows = query.offset(offset).limit(limit).all()
+def explain_stmt(stmt):
+    """EXPLAIN (FORMAT JSON) de la sentencia, para estimar filas sin COUNT."""
+    from sqlalchemy.dialects import postgresql
 
-    return total, rows
+    compiled = stmt.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    return text(f"EXPLAIN (FORMAT JSON) {compiled}")
 
+def plan_rows(plan) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
-def get_first_records_by_year(db, year: int):
-    rows = (
-        db.query(Medicion)
-        .filter(func.extract('year', Medicion.fecha) == year)
-        .filter(Medicion.longitud != -99999)
-        .filter(Medicion.latitud != -99999)
-        .order_by(
-            Medicion.estacion.asc(),
-            Medicion.fecha.asc()
-        )
+def measurements_page_stmt(
+    year: int, page: int, limit: int, after_id: int | None = None, area=None
+):
+    """
+    Con `after_id` se usa paginación keyset (id > after_id), que no recorre
+    las páginas previas; sin él se mantiene la paginación por `page`.
+    """
+    stmt = measurements_by_year_stmt(year, area).order_by(Medicion.id.asc()).limit(limit)
+    if after_id is not None:
+        return stmt.where(Medicion.id > after_id)
+    return stmt.offset((page - 1) * limit)
+
+def first_records_by_year_stmt(year: int):
+    return (
+        select(*FEATURE_COLUMNS)
+        .where(year_range(year))
+        .where(valid_coords())
+        .order_by(Medicion.estacion.asc(), Medicion.fecha.asc())
         .distinct(Medicion.estacion)
-        .all()
     )
-    return rows
-
-def get_records_by_year_and_station(db, year: int, station: str):
-    rows = (
-        db.query(Medicion)
-        .filter(func.extract("year", Medicion.fecha) == year)
-        .filter(Medicion.estacion == station)
-        .filter(Medicion.longitud != -99999)
-        .filter(Medicion.latitud != -99999)
+
+def records_by_year_and_station_stmt(year: int, station: str, area=None):
+    return (
+        select(*FEATURE_COLUMNS)
+        .where(year_range(year))
+        .where(Medicion.estacion == station)
+        .where(valid_coords())
+        .where(spatial_filter(area))
         .order_by(Medicion.estacion.asc(), Medicion.fecha.asc())
-        .all()
     )
-    return rows
-
-def stream_measurements_by_year(db, year: int, block_size: int = 800):
-    offset = 0
-
-    while True:
-        rows = (
-            db.query(Medicion)
-            .filter(func.extract("year", Medicion.fecha) == year)
-            .filter(Medicion.longitud != -99999)
-            .filter(Medicion.latitud != -99999)
-            .order_by(Medicion.id.asc())
-            .offset(offset)
-            .limit(block_size)
-            .all()
-        )
 
-        if not rows:
-            break
+def year_block_stmt(
+    year: int, last_id: int, block_size: int, station: str | None = None, area=None
+):
+    """Bloque keyset del año (id > last_id): no re-lee bloques previos."""
+    stmt = (
+        select(*FEATURE_COLUMNS)
+        .where(year_range(year))
+        .where(valid_coords())
+        .where(spatial_filter(area))
+        .where(Medicion.id > last_id)
+        .order_by(Medicion.id.asc())
+        .limit(block_size)
+    )
+    if station is not None:
+        stmt = stmt.where(Medicion.estacion == station)
+    return stmt
 
-        yield rows
+def stations_by_year_stmt(year: int):
+    return (
+        select(CatalogoEstacionAnio.estacion)
+        .where(CatalogoEstacionAnio.anio == year)
+        .where(CatalogoEstacionAnio.estacion.isnot(None))
+        .order_by(CatalogoEstacionAnio.estacion.asc())
+    )
 
-        offset += block_size
+def ordered_by_station_stmt(year: int):
+    return (
+        select(
+            Medicion.objectid,
+            Medicion.globalid,
+            Medicion.estacion,
+            Medicion.fecha,
+            Medicion.profundidad,
+            Medicion.temperatura,
+            Medicion.salinidad,
+            Medicion.oxigeno,
+            Medicion.longitud,
+            Medicion.latitud,
+        )
+        .where(year_range(year))
+        .where(Medicion.estacion.isnot(None))
+        .where(valid_coords())
+        .order_by(Medicion.estacion.asc(), Medicion.fecha.asc(), Medicion.id.asc())
+    )
 
-def get_stations_by_year(db, year: int):
-    rows = (
-        db.query(Medicion.estacion)
-        .filter(func.extract("year", Medicion.fecha) == year)
-        .filter(Medicion.estacion.isnot(None))
-        .distinct()
-        .order_by(Medicion.estacion.asc())
-        .all()
+def first_feature_per_station_stmt(year: int):
+    """
+    Primer registro (menor OBJECTID, como min(OBJECTID) del backend ArcGIS)
+    de cada estación en el año.
+    """
+    return (
+        select(*FEATURE_COLUMNS, Medicion.fecha_ms)
+        .where(year_range(year))
+        .where(Medicion.estacion.isnot(None))
+        .order_by(Medicion.estacion.asc(), Medicion.objectid.asc())
+        .distinct(Medicion.estacion)
     )
-    return [r[0] for r in rows]
-
-
-def stream_measurements_by_year_and_station(db, year: int, station: str, block_size: int = 500):
-    offset = 0
-
-    while True:
-        rows = (
-            db.query(Medicion)
-            .filter(func.extract("year", Medicion.fecha) == year)
-            .filter(Medicion.estacion == station)
-            .filter(Medicion.longitud != -99999)
-            .filter(Medicion.latitud != -99999)
-            .order_by(Medicion.id.asc())
-            .offset(offset)
-            .limit(block_size)
-            .all()
+
+def nearest_stations_stmt(lon: float, lat: float, k: int, year: int | None = None):
+    """
+    Las `k` estaciones más cercanas al punto, según su posición media en el
+    catálogo (ponderada por registros con coordenadas válidas).
+    """
+    c = CatalogoEstacionAnio
+    weight = c.registros_geo
+    stmt = (
+        select(
+            c.estacion,
+            (func.sum(c.longitud * weight) / func.nullif(func.sum(weight), 0)).label("longitud"),
+            (func.sum(c.latitud * weight) / func.nullif(func.sum(weight), 0)).label("latitud"),
+            func.sum(c.registros).label("registros"),
         )
+        .where(c.estacion.isnot(None))
+        .where(c.registros_geo > 0)
+        .where(c.longitud.isnot(None))
+        .group_by(c.estacion)
+    )
+    if year is not None:
+        stmt = stmt.where(c.anio == year)
+    sub = stmt.subquery()
+    distance = distance_m(sub.c.longitud, sub.c.latitud, lon, lat).label("distancia_m")
+    return (
+        select(sub.c.estacion, sub.c.longitud, sub.c.latitud, sub.c.registros, distance)
+        .order_by(distance.asc(), sub.c.estacion.asc())
+        .limit(k)
+    )
 
-        if not rows:
-            break
+def grid_aggregate_stmt(
+    year: int,
+    cell_deg: float,
+    station: str | None = None,
+    depth_min: float | None = None,
+    depth_max: float | None = None,
+    area=None,
+):
+    """
+    Agregación por celdas de `cell_deg` grados (para mapas a bajo zoom):
+    conteo, centroide y medias de temperatura / salinidad / oxígeno.
+    """
+    ix = func.floor(Medicion.longitud / cell_deg).label("ix")
+    iy = func.floor(Medicion.latitud / cell_deg).label("iy")
+    stmt = (
+        select(
+            ix,
+            iy,
+            func.count().label("registros"),
+            func.avg(Medicion.longitud).label("longitud"),
+            func.avg(Medicion.latitud).label("latitud"),
+            func.avg(Medicion.temperatura).label("temperatura"),
+            func.avg(Medicion.salinidad).label("salinidad"),
+            func.avg(Medicion.oxigeno).label("oxigeno"),
+        )
+        .where(year_range(year))
+        .where(valid_coords())
+        .where(spatial_filter(area))
+        .group_by(ix, iy)
+        .order_by(ix, iy)
+    )
+    if station is not None:
+        stmt = stmt.where(Medicion.estacion == station)
+    if depth_min is not None:
+        stmt = stmt.where(Medicion.profundidad >= depth_min)
+    if depth_max is not None:
+        stmt = stmt.where(Medicion.profundidad <= depth_max)
+    return stmt
+
+SERIES_TABLES = {"day": SerieDiaria, "month": SerieMensual}
+
+def series_stmt(
+    station: str,
+    variable: str,
+    resolution: str,
+    depth: float | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    limit: int | None = None,
+):
+    """
+    Serie temporal (fecha, media, min, max, registros) de `variable` en la
+    estación. Sin `depth` se combinan las profundidades: "day" / "month"
+    leen los rollups (media ponderada por conteo) y "raw" agrupa las
+    mediciones por fecha del lance, así la serie significa lo mismo en
+    todas las resoluciones.
+    """
+    if resolution == "raw":
+        value = getattr(Medicion, variable)
+        stmt = (
+            select(
+                Medicion.fecha.label("fecha"),
+                func.avg(value).label("media"),
+                func.min(value).label("min"),
+                func.max(value).label("max"),
+                func.count(value).label("registros"),
+            )
+            .where(Medicion.estacion == station)
+            .where(Medicion.fecha.isnot(None))
+            .where(value.isnot(None))
+            .group_by(Medicion.fecha)
+            .order_by(Medicion.fecha.asc())
+        )
+        time_col, depth_col = Medicion.fecha, Medicion.profundidad
+    else:
+        t = SERIES_TABLES[resolution]
+        n = getattr(t, f"{variable}_n")
+        stmt = (
+            select(
+                t.periodo.label("fecha"),
+                (func.sum(getattr(t, f"{variable}_media") * n) / func.sum(n)).label("media"),
+                func.min(getattr(t, f"{variable}_min")).label("min"),
+                func.max(getattr(t, f"{variable}_max")).label("max"),
+                func.sum(n).label("registros"),
+            )
+            .where(t.estacion == station)
+            .where(n > 0)
+            .group_by(t.periodo)
+            .order_by(t.periodo.asc())
+        )
+        time_col, depth_col = t.periodo, t.profundidad
+
+    if depth is not None:
+        stmt = stmt.where(depth_col == depth)
+    if date_from is not None:
+        if resolution != "raw":
+            # el período que contiene date_from también entra
+            date_from = period_start(date_from, resolution)
+        stmt = stmt.where(time_col >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(time_col < date_to)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def series_span_stmt(station: str):
+    """Primer y último mes con datos de la estación (para resolution=auto)."""
+    return select(func.min(SerieMensual.periodo), func.max(SerieMensual.periodo)).where(
+        SerieMensual.estacion == station
+    )
 
-        yield rows
-        offset += block_size
+def profile_stmt(
+    station: str | None = None,
+    year: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    cast_by: str = "dia",
+    limit: int | None = None,
+):
+    """
+    Corte para perfiles verticales: (lance, estacion, profundidad, variables)
+    ordenado por lance. El lance es la fecha exacta o el día (`cast_by`);
+    `limit` acota las filas leídas.
+    """
+    cast_key = Medicion.fecha if cast_by == "fecha" else func.date_trunc("day", Medicion.fecha)
+    stmt = (
+        select(
+            cast_key.label("lance"),
+            Medicion.estacion,
+            Medicion.profundidad,
+            Medicion.temperatura,
+            Medicion.salinidad,
+            Medicion.oxigeno,
+        )
+        .where(Medicion.fecha.isnot(None))
+        .where(Medicion.profundidad.isnot(None))
+        .order_by(Medicion.estacion.asc(), cast_key.asc(), Medicion.profundidad.asc())
+    )
+    if station is not None:
+        stmt = stmt.where(Medicion.estacion == station)
+    if year is not None:
+        stmt = stmt.where(year_range(year))
+    if date_from is not None:
+        stmt = stmt.where(Medicion.fecha >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Medicion.fecha < date_to)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+# ---------------------------------------------------------------------------
+# GeoJSON armado por Postgres (json_build_object / json_agg)
+# ---------------------------------------------------------------------------
+
+def _lit(value: str):
+    # claves constantes como literales SQL (no parámetros sin tipo)
+    return literal_column(f"'{value}'")
+
+def feature_json(c):
+    """
+    Feature GeoJSON como expresión SQL sobre las columnas `c` (FEATURE_COLUMNS),
+    con las mismas propiedades que features_to_geojson_from_db.
+    """
+    geometry = case(
+        (
+            and_(c.longitud.isnot(None), c.latitud.isnot(None)),
+            func.json_build_object(
+                _lit("type"), _lit("Point"),
+                _lit("coordinates"), func.json_build_array(c.longitud, c.latitud),
+            ),
+        ),
+    )
+    props = func.json_build_object(
+        _lit("objectid"), c.objectid,
+        _lit("globalid"), c.globalid,
+        _lit("estacion"), c.estacion,
+        _lit("fecha"), func.to_char(c.fecha, _lit("YYYY-MM-DD HH24:MI:SS")),
+        _lit("profundidad"), c.profundidad,
+        _lit("temperatura"), c.temperatura,
+        _lit("salinidad"), c.salinidad,
+        _lit("oxigeno"), c.oxigeno,
+        _lit("created_date_ms"), c.created_date_ms,
+        _lit("last_edited_date_ms"), c.last_edited_date_ms,
+    )
+    return func.json_build_object(
+        _lit("type"), _lit("Feature"),
+        _lit("geometry"), geometry,
+        _lit("properties"), props,
+    )
 
-async def get_unique_years() -> List[int]:
+def feature_collection_json_stmt(stmt, *order: str):
     """
-    Obtiene los años únicos presentes en el campo 'Fecha' del servicio.
+    (count, features) donde features es el arreglo JSON ya serializado de
+    todas las filas de `stmt`, ordenado por las columnas `order`.
     """
-    url = f"{settings.full_external_api_url}?where=1=1&outFields=Fecha&f=geojson"
+    sub = stmt.order_by(None).subquery()
+    features = func.json_agg(aggregate_order_by(feature_json(sub.c), *(sub.c[o] for o in order)))
+    return select(
+        func.count(),
+        cast(func.coalesce(features, literal_column("'[]'::json")), Text),
+    ).select_from(sub)
+
+def year_block_json_stmt(year: int, last_id: int, block_size: int, area=None):
+    """Bloque keyset del año con cada feature ya serializada como texto."""
+    sub = year_block_stmt(year, last_id, block_size, area=area).subquery()
+    return select(sub.c.id, cast(feature_json(sub.c), Text)).order_by(sub.c.id)
+
+# ---------------------------------------------------------------------------
+# Versión síncrona: solo la exportación a Excel (openpyxl escribe a disco de
+# forma bloqueante); las rutas usan async_db_service
+# ---------------------------------------------------------------------------
 
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            if "error" in data:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Error del servicio ArcGIS: {data['error'].get('message', 'Desconocido')}"
-                )
-
-            unique_years = set()
-            for feature in data.get("features", []):
-                fecha_ms = feature.get("properties", {}).get("Fecha")
-                if fecha_ms is not None:
-                    try:
-                        # Convertir milisegundos a año
-                        year = datetime.utcfromtimestamp(fecha_ms / 1000).year
-                        unique_years.add(year)
-                    except (ValueError, OSError, TypeError):
-                        continue  # valor inválido, lo ignoramos
+def get_stations_by_year(db, year: int):
+    return db.execute(stations_by_year_stmt(year)).scalars().all()
 
-            return sorted(unique_years)
+def iter_measurements_by_year_ordered_by_station(db, year: int, block_size: int = 2000):
+    """
+    Un único recorrido del año ordenado por estación y fecha, leído con
+    cursor del servidor (yield_per) de a `block_size` filas. Pensado para
+    exportaciones que cambian de hoja/archivo en cada cambio de estación.
+    """
+    stmt = ordered_by_station_stmt(year).execution_options(yield_per=block_size)
+    yield from db.execute(stmt)
 
+# Consultas al servicio ArcGIS de meteorología, cacheadas por TTL
+arcgis_cache = TTLCache(settings.arcgis_cache_ttl)
+
+async def _arcgis_query(params: Dict[str, Any], unsupported_ok: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Consulta al servicio con los errores traducidos a HTTPException. Con
+    `unsupported_ok`, un error de consulta de ArcGIS (4xx: p. ej. una
+    estadística que el servicio no admite) devuelve None.
+    """
+    try:
+        return await get_arcgis_client().query(params)
+    except ArcGISQueryError as e:
+        if unsupported_ok and not e.retryable:
+            return None
+        raise HTTPException(status_code=502, detail=f"Error del servicio ArcGIS: {str(e)}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Tiempo de espera agotado")
     except httpx.RequestError as e:
         raise HTTPException(status_code=502, detail=f"Error de red: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Error del servicio ArcGIS: {str(e)}")
+
+def _year_where(year: int) -> str:
+    return f"Fecha >= DATE '{year}-01-01' AND Fecha < DATE '{year + 1}-01-01'"
+
+async def _unique_years_from_arcgis() -> List[int]:
+    """
+    Años con datos calculados por ArcGIS: una consulta agrupada por
+    EXTRACT(YEAR FROM Fecha). Si el servicio no admite expresiones en
+    groupByFieldsForStatistics, min / max de Fecha y un returnCountOnly por
+    año del rango. Nunca se pagina por los valores de Fecha.
+    """
+    data = await _arcgis_query({
+        "where": "Fecha IS NOT NULL",
+        "groupByFieldsForStatistics": "EXTRACT(YEAR FROM Fecha)",
+        "outStatistics": json.dumps([{
+            "statisticType": "count",
+            "onStatisticField": "OBJECTID",
+            "outStatisticFieldName": "registros",
+        }]),
+        "f": "json",
+    }, unsupported_ok=True)
+    if data is not None:
+        years = set()
+        for feature in data.get("features", []):
+            # el campo del grupo no tiene nombre fijo (EXPR_1, ...): es el otro atributo
+            for name, value in feature.get("attributes", {}).items():
+                if name.lower() != "registros" and value is not None:
+                    try:
+                        years.add(int(value))
+                    except (TypeError, ValueError):
+                        continue
+        return sorted(years)
+
+    stats = await _arcgis_query({
+        "where": "Fecha IS NOT NULL",
+        "outStatistics": json.dumps([
+            {"statisticType": "min", "onStatisticField": "Fecha", "outStatisticFieldName": "desde"},
+            {"statisticType": "max", "onStatisticField": "Fecha", "outStatisticFieldName": "hasta"},
+        ]),
+        "f": "json",
+    })
+    features = stats.get("features", [])
+    attrs = features[0].get("attributes", {}) if features else {}
+    if attrs.get("desde") is None or attrs.get("hasta") is None:
+        return []
+    # mismo rango válido que get_unique_stations_by_year
+    first = max(datetime.utcfromtimestamp(attrs["desde"] / 1000).year, 1900)
+    last = min(datetime.utcfromtimestamp(attrs["hasta"] / 1000).year, 2100)
+    candidates = list(range(first, last + 1))
+    counts = await asyncio.gather(*(
+        _arcgis_query({"where": _year_where(year), "returnCountOnly": "true", "f": "json"})
+        for year in candidates
+    ))
+    return [year for year, data in zip(candidates, counts) if data.get("count")]
+
+async def _unique_stations_from_arcgis(year: int) -> List[Dict[str, Any]]:
+    """
+    groupByFieldsForStatistics=Estacion con min(OBJECTID) y luego solo esos
+    registros, en vez de descargar todas las features del año.
+    """
+    stats = await _arcgis_query({
+        "where": _year_where(year),
+        "groupByFieldsForStatistics": "Estacion",
+        "outStatistics": json.dumps([{
+            "statisticType": "min",
+            "onStatisticField": "OBJECTID",
+            "outStatisticFieldName": "first_oid",
+        }]),
+        "f": "json",
+    })
+    oids = [
+        f["attributes"]["first_oid"]
+        for f in stats.get("features", [])
+        if f.get("attributes", {}).get("Estacion") and f["attributes"].get("first_oid") is not None
+    ]
+    if not oids:
+        return []
+
+    data = await _arcgis_query({
+        "objectIds": ",".join(str(o) for o in oids),
+        "outFields": "*",
+        "orderByFields": "Estacion",
+        "f": "geojson",
+    })
+    return data.get("features", [])
+
+async def get_unique_years() -> List[int]:
+    """
+    Obtiene los años únicos presentes en el campo 'Fecha' del servicio.
+    Con el backend "db" se leen del catálogo local que mantiene el ETL.
+    """
+    if settings.meteorologia_backend == "db":
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(years_stmt())).scalars().all()
+
+    cached = arcgis_cache.get("years")
+    if cached is None:
+        cached = await _unique_years_from_arcgis()
+        arcgis_cache.set("years", cached)
+    return cached
 
 async def get_unique_stations_by_year(year: int) -> List[Dict[str, Any]]:
     """
-    Obtiene una única feature por estación (la primera encontrada)
+    Obtiene una única feature por estación (la primera)
     durante el año especificado, con geometría y propiedades completas.
-    Usa la sintaxis DATE de ArcGIS para compatibilidad.
+    Con el backend "db" se arma desde la tabla local `mediciones`.
     """
     if year < 1900 or year > 2100:
         raise HTTPException(status_code=400, detail="Año fuera de rango válido")
 
-    where_clause = f"Fecha >= DATE '{year}-01-01' AND Fecha < DATE '{year + 1}-01-01'"
-    url = f"{settings.full_external_api_url}?where={where_clause}&outFields=*&f=geojson"
-
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            if "error" in data:
-                msg = data["error"].get("message", "Error desconocido del servicio")
-                raise HTTPException(status_code=502, detail=f"Error del servicio ArcGIS: {msg}")
-
-            seen_stations = set()
-            unique_features = []
-
-            for feature in data.get("features", []):
-                estacion = feature.get("properties", {}).get("Estacion")
-                if estacion and estacion not in seen_stations:
-                    unique_features.append(feature)
-                    seen_stations.add(estacion)
-
-            return unique_features
-
-    except httpx.TimeoutException:
-        raise HTTPException(status_code=504, detail="Tiempo de espera agotado")
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=502, detail=f"Error de red: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+    if settings.meteorologia_backend == "db":
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(first_feature_per_station_stmt(year))).all()
+        return features_to_arcgis_geojson_from_db(rows)
+
+    key = f"stations:{year}"
+    cached = arcgis_cache.get(key)
+    if cached is None:
+        cached = await _unique_stations_from_arcgis(year)
+        arcgis_cache.set(key, cached)
+    return cached
@@ -0,0 +1,131 @@
+import queue
+import threading
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.db import engine
+from app.models import Medicion
+from app.services.db_service import year_range
+
+# Exportación CSV masiva con COPY (SELECT ...) TO STDOUT: Postgres genera el
+# CSV y los bytes pasan directo del socket de psycopg2 a la respuesta, sin
+# crear objetos fila en Python.
+
+CSV_COLUMNS = (
+    Medicion.objectid,
+    Medicion.globalid,
+    Medicion.estacion,
+    Medicion.fecha,
+    Medicion.profundidad,
+    Medicion.temperatura,
+    Medicion.salinidad,
+    Medicion.oxigeno,
+    Medicion.longitud,
+    Medicion.latitud,
+)
+
+def csv_export_stmt(
+    year: Optional[int] = None,
+    station: Optional[str] = None,
+    depth_min: Optional[float] = None,
+    depth_max: Optional[float] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    stmt = select(*CSV_COLUMNS).order_by(Medicion.id.asc())
+    if year is not None:
+        stmt = stmt.where(year_range(year))
+    if station is not None:
+        stmt = stmt.where(Medicion.estacion == station)
+    if depth_min is not None:
+        stmt = stmt.where(Medicion.profundidad >= depth_min)
+    if depth_max is not None:
+        stmt = stmt.where(Medicion.profundidad <= depth_max)
+    if date_from is not None:
+        stmt = stmt.where(Medicion.fecha >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Medicion.fecha < date_to)
+    return stmt
+
+
+class _QueueWriter:
+    """Archivo de escritura para copy_expert que entrega los bytes por una cola."""
+
+    def __init__(self, chunks: queue.Queue, stop: threading.Event):
+        self.chunks = chunks
+        self.stop = stop
+
+    def write(self, data):
+        if self.stop.is_set():
+            raise IOError("exportación cancelada por el cliente")
+        self.chunks.put(bytes(data) if not isinstance(data, str) else data.encode("utf-8"))
+        return len(data)
+
+
+def stream_copy_csv(stmt, compress: bool = False, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    """
+    Ejecuta COPY (stmt) TO STDOUT en un hilo con una conexión psycopg2 del
+    pool y devuelve el CSV por partes (gzip si `compress`).
+    """
+    compiled = stmt.compile(dialect=postgresql.psycopg2.dialect())
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    select_sql = cursor.mogrify(compiled.string, compiled.params).decode("utf-8")
+    copy_sql = f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+    chunks = queue.Queue(maxsize=64)
+    stop = threading.Event()
+    done = object()
+    error = []
+
+    def run():
+        try:
+            cursor.copy_expert(copy_sql, _QueueWriter(chunks, stop), size=chunk_size)
+        except BaseException as e:
+            error.append(e)
+        finally:
+            chunks.put(done)
+
+    worker = threading.Thread(target=run, name="csv-copy", daemon=True)
+    worker.start()
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    buffered = 0
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                break
+            buffer.append(item)
+            buffered += len(item)
+            if buffered < chunk_size:
+                continue
+            data = b"".join(buffer)
+            buffer, buffered = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+        if error:
+            raise error[0]
+        data = b"".join(buffer)
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+    finally:
+        stop.set()
+        # liberar al hilo si quedó bloqueado en una cola llena
+        while worker.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        cursor.close()
+        if error or not raw.dbapi_connection or raw.dbapi_connection.closed:
+            raw.invalidate()
+        else:
+            raw.rollback()
+            raw.close()
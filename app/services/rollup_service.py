@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func, and_, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models import Medicion, SerieDiaria, SerieMensual, SeriePendiente
+
+# Series diarias y mensuales por estación y profundidad (min / max / media /
+# conteos) para los gráficos. El ETL anota en `serie_pendiente` los días
+# (por estación) que tocó cada lote y al final recalcula solo esos días y
+# sus meses; sin series previas se recalculan completas.
+
+VARIABLES = ("temperatura", "salinidad", "oxigeno")
+
+# tabla -> unidad de date_trunc
+ROLLUPS = ((SerieDiaria, "day"), (SerieMensual, "month"))
+
+def period_start(value: datetime, unit: str) -> datetime:
+    if unit == "day":
+        return datetime(value.year, value.month, value.day)
+    return datetime(value.year, value.month, 1)
+
+def next_period(value: datetime, unit: str) -> datetime:
+    if unit == "day":
+        return value + timedelta(days=1)
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def _aggregate_columns():
+    cols = [func.count()]
+    for var in VARIABLES:
+        col = getattr(Medicion, var)
+        cols += [func.min(col), func.max(col), func.avg(col), func.count(col)]
+    return cols
+
+def _rollup_column_names():
+    names = ["estacion", "profundidad", "periodo", "registros"]
+    for var in VARIABLES:
+        names += [f"{var}_min", f"{var}_max", f"{var}_media", f"{var}_n"]
+    return names
+
+def _source(unit: str):
+    # las series se consultan siempre por estación: sin estación no se agregan
+    periodo = func.date_trunc(unit, Medicion.fecha)
+    return (
+        select(Medicion.estacion, Medicion.profundidad, periodo, *_aggregate_columns())
+        .where(Medicion.fecha.isnot(None))
+        .where(Medicion.estacion.isnot(None))
+        .group_by(Medicion.estacion, Medicion.profundidad, periodo)
+    )
+
+def refresh_rollups(session):
+    """Recalcula las series completas y descarta los días pendientes."""
+    for table, unit in ROLLUPS:
+        session.execute(delete(table))
+        session.execute(insert(table).from_select(_rollup_column_names(), _source(unit)))
+    session.execute(delete(SeriePendiente))
+
+def mark_pending(session, buckets):
+    """Anota días (estacion, datetime) a recalcular; va en la transacción del lote."""
+    values = [
+        {"estacion": estacion, "dia": period_start(fecha, "day")}
+        for estacion, fecha in buckets
+        if estacion is not None and fecha is not None
+    ]
+    if values:
+        session.execute(pg_insert(SeriePendiente).values(values).on_conflict_do_nothing())
+
+def refresh_pending_rollups(session) -> int:
+    """
+    Recalcula solo los días pendientes (y los meses que los contienen) de
+    cada estación; devuelve cuántos días había. Incluye los que dejó una
+    corrida anterior que falló después de confirmar datos.
+    """
+    pending = session.query(func.count()).select_from(SeriePendiente).scalar()
+    if not pending:
+        return 0
+    for table, unit in ROLLUPS:
+        buckets = (
+            select(SeriePendiente.estacion, func.date_trunc(unit, SeriePendiente.dia).label("periodo"))
+            .distinct()
+            .subquery()
+        )
+        session.execute(
+            delete(table).where(
+                tuple_(table.estacion, table.periodo).in_(select(buckets.c.estacion, buckets.c.periodo))
+            )
+        )
+        # rango por estación y período: usa el índice (estacion, fecha)
+        source = _source(unit).join(
+            buckets,
+            and_(
+                Medicion.estacion == buckets.c.estacion,
+                Medicion.fecha >= buckets.c.periodo,
+                Medicion.fecha < buckets.c.periodo + literal_column(f"interval '1 {unit}'"),
+            ),
+        )
+        session.execute(insert(table).from_select(_rollup_column_names(), source))
+    session.execute(delete(SeriePendiente))
+    return pending
+
+def rollups_are_empty(session) -> bool:
+    return session.query(SerieMensual.id).first() is None
@@ -1,28 +1,136 @@
-import requests
+import asyncio
+import queue
+import threading
+from collections import deque
+from app.core.arcgis_client import ArcGISClient
 from app.core.config import settings
 
-def fetch_all_arcgis_records(where: str = "1=1", batch_size: int | None = None):
-    batch_size = batch_size or settings.arc_batch_size
-    all_features = []
-    offset = 0
+async def _query(client, params, semaphore, label=""):
+    async with semaphore:
+        return await client.query(params, label)
+
+
+async def fetch_record_count(client, semaphore, where: str = "1=1") -> int:
+    params = {"where": where, "returnCountOnly": "true", "f": "json"}
+    data = await _query(client, params, semaphore, "count")
+    return int(data.get("count", 0))
+
 
-    while True:
+async def _fetch_page(client, semaphore, where, offset, size):
+    """
+    Descarga la página [offset, offset + size). Si el servidor tiene un
+    maxRecordCount menor que `size`, se piden los registros faltantes.
+    """
+    features = []
+    while len(features) < size:
         params = {
             "where": where,
             "outFields": "*",
             "f": "json",
-            "resultOffset": offset,
-            "resultRecordCount": batch_size
+            "orderByFields": "OBJECTID ASC",
+            "resultOffset": offset + len(features),
+            "resultRecordCount": size - len(features),
         }
-        resp = requests.get(settings.full_external_api_url, params=params, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
-        features = data.get("features", [])
-        if not features:
+        data = await _query(client, params, semaphore, f"offset={params['resultOffset']}")
+        page = data.get("features", [])
+        if not page:
             break
-        all_features.extend(features)
-        if len(features) < batch_size:
-            break
-        offset += batch_size
+        features.extend(page)
+    return features
+
+
+async def iter_arcgis_pages_async(
+    where: str = "1=1",
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+):
+    """
+    Async iterator de páginas (listas de features) ordenadas por OBJECTID.
+    Obtiene primero el total (returnCountOnly) y mantiene a lo sumo
+    `concurrency` páginas en vuelo: mientras se consume la página N ya se
+    están descargando las siguientes, sin acumular la capa en memoria.
+    """
+    batch_size = batch_size or settings.arc_batch_size
+    concurrency = concurrency or settings.arc_concurrency
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with ArcGISClient() as client:
+        total = await fetch_record_count(client, semaphore, where)
+        offsets = iter(range(0, total, batch_size))
+        in_flight = deque()
 
+        def schedule():
+            offset = next(offsets, None)
+            if offset is not None:
+                in_flight.append(asyncio.ensure_future(
+                    _fetch_page(client, semaphore, where, offset, min(batch_size, total - offset))
+                ))
+
+        for _ in range(concurrency):
+            schedule()
+        try:
+            while in_flight:
+                page = await in_flight.popleft()
+                schedule()
+                yield page
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+
+def iter_arcgis_pages(
+    where: str = "1=1",
+    batch_size: int | None = None,
+    prefetch: int | None = None,
+):
+    """
+    Versión síncrona de `iter_arcgis_pages_async` para el ETL: la descarga
+    corre en un hilo con su propio event loop y entrega las páginas por una
+    cola acotada a `prefetch` elementos.
+    """
+    pages = queue.Queue(maxsize=prefetch or settings.arc_concurrency)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def produce():
+        async for page in iter_arcgis_pages_async(where, batch_size):
+            # no bloquear el loop: las páginas en vuelo siguen descargándose
+            if not await asyncio.to_thread(put, page):
+                break
+
+    def run():
+        try:
+            asyncio.run(produce())
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    worker = threading.Thread(target=run, name="arcgis-fetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+def fetch_all_arcgis_records(where: str = "1=1", batch_size: int | None = None):
+    all_features = []
+    for page in iter_arcgis_pages(where, batch_size):
+        all_features.extend(page)
     return all_features
@@ -0,0 +1,108 @@
+import orjson
+from typing import AsyncIterable, AsyncIterator, List
+from fastapi import HTTPException
+
+# Exportaciones columnares de mediciones (Arrow IPC, Parquet, JSON por
+# columnas). Se arman por bloques a partir de las filas que entrega la
+# base (db_service.FEATURE_COLUMNS), sin repetir las claves por registro.
+
+EXPORT_FIELDS = (
+    "objectid", "globalid", "estacion", "fecha", "profundidad",
+    "temperatura", "salinidad", "oxigeno", "longitud", "latitud",
+)
+
+def require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Formato no disponible: falta pyarrow")
+    return pa, pq
+
+def _schema(pa):
+    return pa.schema([
+        ("objectid", pa.int32()),
+        ("globalid", pa.string()),
+        ("estacion", pa.string()),
+        ("fecha", pa.timestamp("ms")),
+        ("profundidad", pa.float64()),
+        ("temperatura", pa.float64()),
+        ("salinidad", pa.float64()),
+        ("oxigeno", pa.float64()),
+        ("longitud", pa.float64()),
+        ("latitud", pa.float64()),
+    ])
+
+def _record_batch(pa, schema, rows):
+    return pa.record_batch(
+        [pa.array([getattr(r, f) for r in rows], type=schema.field(f).type) for f in EXPORT_FIELDS],
+        schema=schema,
+    )
+
+class _ChunkSink:
+    """Destino de escritura para pyarrow que acumula bytes hasta drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+async def stream_arrow(blocks: AsyncIterable[List]) -> AsyncIterator[bytes]:
+    """Arrow IPC stream: un record batch por bloque leído de la base."""
+    pa, _ = require_pyarrow()
+    schema = _schema(pa)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    async for rows in blocks:
+        writer.write_batch(_record_batch(pa, schema, rows))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+async def stream_parquet(blocks: AsyncIterable[List]) -> AsyncIterator[bytes]:
+    """Parquet escrito por row groups; el footer se envía al final."""
+    pa, pq = require_pyarrow()
+    schema = _schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    async for rows in blocks:
+        writer.write_batch(_record_batch(pa, schema, rows))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+async def columnar_json(blocks: AsyncIterable[List]) -> bytes:
+    """{"count": N, "columns": [...], "data": {campo: [valores...]}}"""
+    data = {f: [] for f in EXPORT_FIELDS}
+    count = 0
+    async for rows in blocks:
+        for f in EXPORT_FIELDS:
+            values = [getattr(r, f) for r in rows]
+            if f == "fecha":
+                values = [v.isoformat(" ", "seconds") if v else None for v in values]
+            data[f].extend(values)
+        count += len(rows)
+    return orjson.dumps({"count": count, "columns": list(EXPORT_FIELDS), "data": data})
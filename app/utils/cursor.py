@@ -0,0 +1,20 @@
+import base64
+import json
+from fastapi import HTTPException
+
+# Cursores opacos para paginación keyset: el cliente solo reenvía el token
+# que devolvió la página anterior.
+
+def encode_cursor(**values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, dict):
+            raise ValueError(token)
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
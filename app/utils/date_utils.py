@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 def convertir_timestamp_ms_to_str(timestamp_ms):
     if not timestamp_ms:
@@ -15,3 +15,9 @@ def ms_to_datetime(timestamp_ms):
         return datetime.utcfromtimestamp(timestamp_ms / 1000)
     except:
         return None
+
+def to_naive_utc(value):
+    """datetime con zona -> UTC sin zona (así se guarda `fecha`); sin zona queda igual."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
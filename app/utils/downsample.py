@@ -0,0 +1,34 @@
+import numpy as np
+
+def lttb(x, y, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices de `threshold` puntos de la serie
+    (x creciente) que conservan su forma visual. Siempre incluye el primer y
+    el último punto. Si la serie ya es corta devuelve todos los índices.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # límites de los threshold - 2 buckets interiores
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # promedio del bucket siguiente (o el último punto)
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], edges[i + 2])
+            avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
@@ -0,0 +1,111 @@
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Grilla regular lon/lat para el acceso espacial sin PostGIS: cada medición
+# guarda el id de su celda (columna `mediciones.celda`, índice btree) y las
+# consultas por bbox o radio se traducen a rangos de celdas.
+
+CELL_DEG = 0.1
+N_COLS = int(round(360 / CELL_DEG))
+N_ROWS = int(round(180 / CELL_DEG))
+EARTH_RADIUS_M = 6371008.8
+
+
+def _col(lon: float) -> int:
+    return min(max(int(math.floor((lon + 180.0) / CELL_DEG)), 0), N_COLS - 1)
+
+
+def _row(lat: float) -> int:
+    return min(max(int(math.floor((lat + 90.0) / CELL_DEG)), 0), N_ROWS - 1)
+
+
+def cell_id(lon: Optional[float], lat: Optional[float]) -> Optional[int]:
+    """Celda de la grilla o None para coordenadas nulas / centinela -99999."""
+    if lon is None or lat is None:
+        return None
+    if not (-180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0):
+        return None
+    return _row(lat) * N_COLS + _col(lon)
+
+
+@dataclass
+class BBox:
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+    def lon_spans(self) -> List[Tuple[float, float]]:
+        # una bbox que cruza el antimeridiano (min_lon > max_lon) son dos tramos
+        if self.min_lon <= self.max_lon:
+            return [(self.min_lon, self.max_lon)]
+        return [(self.min_lon, 180.0), (-180.0, self.max_lon)]
+
+    def cell_ranges(self, max_ranges: int = 256) -> List[Tuple[int, int]]:
+        """
+        Rangos [desde, hasta] de ids de celda que cubren la bbox: uno por fila
+        de la grilla y tramo de longitud. Si serían demasiados se devuelve un
+        único rango que los abarca (el filtro exacto por lon/lat se aplica igual).
+        """
+        r0, r1 = _row(self.min_lat), _row(self.max_lat)
+        spans = [(_col(a), _col(b)) for a, b in self.lon_spans()]
+        if (r1 - r0 + 1) * len(spans) > max_ranges:
+            return [(r0 * N_COLS, r1 * N_COLS + N_COLS - 1)]
+        return [(r * N_COLS + c0, r * N_COLS + c1) for r in range(r0, r1 + 1) for c0, c1 in spans]
+
+
+@dataclass
+class Near:
+    lon: float
+    lat: float
+    radius_m: float
+
+    def bbox(self) -> BBox:
+        """Bbox que contiene el círculo (se recorta en los polos)."""
+        dlat = math.degrees(self.radius_m / EARTH_RADIUS_M)
+        min_lat = max(self.lat - dlat, -90.0)
+        max_lat = min(self.lat + dlat, 90.0)
+        cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        if cos_lat < 1e-6 or dlat / cos_lat >= 180.0:
+            return BBox(-180.0, min_lat, 180.0, max_lat)
+        dlon = dlat / cos_lat
+        min_lon = self.lon - dlon
+        max_lon = self.lon + dlon
+        if min_lon < -180.0:
+            min_lon += 360.0
+        if max_lon > 180.0:
+            max_lon -= 360.0
+        return BBox(min_lon, min_lat, max_lon, max_lat)
+
+
+def zoom_cell_deg(zoom: int, cells_per_tile: int = 4) -> float:
+    """
+    Tamaño de celda (grados) para agregar puntos a un nivel de zoom de mapa
+    web: `cells_per_tile` celdas por lado de cada tesela de 256 px.
+    """
+    return 360.0 / (2 ** zoom) / cells_per_tile
+
+
+def parse_bbox(value: str) -> BBox:
+    """'min_lon,min_lat,max_lon,max_lat' -> BBox (ValueError si no es válida)."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox debe tener 4 valores")
+    bbox = BBox(*parts)
+    if not (-180 <= bbox.min_lon <= 180 and -180 <= bbox.max_lon <= 180):
+        raise ValueError("longitud fuera de rango")
+    if not (-90 <= bbox.min_lat <= bbox.max_lat <= 90):
+        raise ValueError("latitud fuera de rango")
+    return bbox
+
+
+def parse_near(value: str, radius_m: float) -> Near:
+    """'lon,lat' + radio en metros -> Near (ValueError si no es válido)."""
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 2:
+        raise ValueError("near debe ser lon,lat")
+    lon, lat = parts
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90) or radius_m <= 0:
+        raise ValueError("near/radius fuera de rango")
+    return Near(lon, lat, radius_m)
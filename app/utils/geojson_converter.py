@@ -34,6 +34,7 @@ def arcgis_to_geojson(features: list):
     }
 
 # DB rows -> GeoJSON features
+# `rows` pueden ser objetos Medicion o filas Row de db_service.FEATURE_COLUMNS
 def features_to_geojson_from_db(rows):
     features = []
     for r in rows:
@@ -41,7 +42,8 @@ def features_to_geojson_from_db(rows):
             "objectid": r.objectid,
             "globalid": r.globalid,
             "estacion": r.estacion,
-            "fecha": r.fecha.strftime("%Y-%m-%d %H:%M:%S") if r.fecha else None,
+            # isoformat(" ", "seconds") == strftime("%Y-%m-%d %H:%M:%S"), más barato
+            "fecha": r.fecha.isoformat(" ", "seconds") if r.fecha else None,
             "profundidad": r.profundidad,
             "temperatura": r.temperatura,
             "salinidad": r.salinidad,
@@ -54,3 +56,27 @@ def features_to_geojson_from_db(rows):
             geometry = {"type": "Point", "coordinates": [r.longitud, r.latitud]}
         features.append({"type": "Feature", "geometry": geometry, "properties": props})
     return features
+
+# DB rows -> features con los nombres de campo de ArcGIS (f=geojson)
+def features_to_arcgis_geojson_from_db(rows):
+    features = []
+    for r in rows:
+        props = {
+            "OBJECTID": r.objectid,
+            "GlobalID": r.globalid,
+            "Estacion": r.estacion,
+            "Fecha": r.fecha_ms,
+            "Longitud": r.longitud,
+            "Latitud": r.latitud,
+            "Profundidad": r.profundidad,
+            "Temperatura": r.temperatura,
+            "Salinidad": r.salinidad,
+            "Oxigeno": r.oxigeno,
+            "created_date": r.created_date_ms,
+            "last_edited_date": r.last_edited_date_ms
+        }
+        geometry = None
+        if r.longitud is not None and r.latitud is not None:
+            geometry = {"type": "Point", "coordinates": [r.longitud, r.latitud]}
+        features.append({"type": "Feature", "id": r.objectid, "geometry": geometry, "properties": props})
+    return features
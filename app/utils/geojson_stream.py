@@ -0,0 +1,66 @@
+import orjson
+from typing import AsyncIterable, AsyncIterator, List, Dict, Any, Union
+
+# Escritores de GeoJSON por partes: cada bloque de features se serializa y
+# se envía en cuanto llega de la base, sin armar la colección completa.
+# Los bloques pueden traer dicts o features ya serializadas por Postgres
+# (str/bytes), que se copian tal cual.
+
+Feature = Union[Dict[str, Any], str, bytes]
+
+def _dumps(obj) -> bytes:
+    return orjson.dumps(obj)
+
+def _encode(feature: Feature) -> bytes:
+    if isinstance(feature, bytes):
+        return feature
+    if isinstance(feature, str):
+        return feature.encode("utf-8")
+    return _dumps(feature)
+
+def _head(members: Dict[str, Any]) -> bytes:
+    # '{"a":1,...}' -> '{"a":1,...' para seguir agregando miembros
+    return _dumps(members)[:-1]
+
+async def stream_feature_collection(
+    chunks: AsyncIterable[List[Feature]],
+    total_key: str = "total_registros",
+    **members,
+) -> AsyncIterator[bytes]:
+    """
+    Emite '{<members>,"type":"FeatureCollection","features":[' seguido de las
+    features de cada bloque y cierra con el total, que solo se conoce al final.
+    """
+    yield _head({**members, "type": "FeatureCollection"}) + b',"features":['
+
+    total = 0
+    async for features in chunks:
+        if not features:
+            continue
+        body = b",".join(_encode(f) for f in features)
+        yield body if total == 0 else b"," + body
+        total += len(features)
+
+    yield b'],' + _dumps(total_key) + b":" + _dumps(total) + b"}"
+
+async def stream_feature_sequence(
+    chunks: AsyncIterable[List[Feature]],
+    record_separator: bool = True,
+) -> AsyncIterator[bytes]:
+    """
+    Una feature por línea: GeoJSON Text Sequence (RFC 8142, cada registro
+    precedido por RS) o NDJSON si `record_separator` es False.
+    """
+    prefix = b"\x1e" if record_separator else b""
+    async for features in chunks:
+        if features:
+            yield b"".join(prefix + _encode(f) + b"\n" for f in features)
+
+def raw_feature_collection(features_json: str, **members) -> bytes:
+    """
+    Objeto JSON con `members` y "features" = `features_json`, un arreglo ya
+    serializado (p. ej. por json_agg en Postgres) que se inserta sin parsear.
+    """
+    if not members:
+        return b'{"features":' + features_json.encode("utf-8") + b"}"
+    return _head(members) + b',"features":' + features_json.encode("utf-8") + b"}"
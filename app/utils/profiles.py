@@ -0,0 +1,144 @@
+import numpy as np
+
+# Perfiles verticales: todas las estaciones/lances de un corte se cargan en
+# arreglos NumPy y se interpolan juntos (sin bucles por fila ni consultas por
+# profundidad). Un "lance" (cast) son las mediciones con la misma clave de
+# tiempo: la fecha exacta o el día, según el endpoint.
+
+STANDARD_LEVELS = (
+    0, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 125, 150, 200,
+    250, 300, 400, 500, 600, 700, 800, 900, 1000, 1200, 1500, 2000,
+)
+VARIABLES = ("temperatura", "salinidad", "oxigeno")
+
+def to_matrix(cast_index, depth, value, n_casts):
+    """
+    Matriz (lances x muestras) con las profundidades ordenadas de cada lance.
+    Las posiciones vacías o con valor nulo quedan con profundidad +inf y
+    valor NaN, así no intervienen en la interpolación.
+    """
+    counts = np.bincount(cast_index, minlength=n_casts)
+    width = max(int(counts.max()) if n_casts else 0, 1)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = np.arange(len(cast_index)) - starts[cast_index]
+
+    d = np.full((n_casts, width), np.inf)
+    v = np.full((n_casts, width), np.nan)
+    valid = ~np.isnan(value) & ~np.isnan(depth)
+    d[cast_index[valid], pos[valid]] = depth[valid]
+    v[cast_index[valid], pos[valid]] = value[valid]
+
+    order = np.argsort(d, axis=1, kind="stable")
+    return np.take_along_axis(d, order, axis=1), np.take_along_axis(v, order, axis=1)
+
+# celdas (lances x muestras x niveles) de la comparación intermedia de
+# interpolate: los lances se procesan en bloques para no superar este tamaño
+INTERP_BLOCK_CELLS = 4_000_000
+
+def interpolate(d, v, levels):
+    """
+    Interpolación lineal de cada lance (filas de d/v) en `levels`; NaN fuera
+    del rango medido (no se extrapola). Devuelve (lances x niveles).
+    """
+    levels = np.asarray(levels, dtype=float)
+    block = max(1, INTERP_BLOCK_CELLS // max(d.shape[1] * len(levels), 1))
+    if d.shape[0] <= block:
+        return _interpolate_block(d, v, levels)
+    return np.concatenate([
+        _interpolate_block(d[i:i + block], v[i:i + block], levels)
+        for i in range(0, d.shape[0], block)
+    ])
+
+def _interpolate_block(d, v, levels):
+    n = np.isfinite(d).sum(axis=1)[:, None]                   # muestras por lance
+    hi = (d[:, :, None] <= levels[None, None, :]).sum(axis=1)  # primer índice > nivel
+    lo = hi - 1
+    inside = (lo >= 0) & (lo < n)
+
+    lo_c = np.clip(lo, 0, d.shape[1] - 1)
+    hi_c = np.clip(hi, 0, d.shape[1] - 1)
+    d_lo = np.take_along_axis(d, lo_c, axis=1)
+    d_hi = np.take_along_axis(d, hi_c, axis=1)
+    v_lo = np.take_along_axis(v, lo_c, axis=1)
+    v_hi = np.take_along_axis(v, hi_c, axis=1)
+
+    exact = inside & (d_lo == levels[None, :])
+    between = inside & ~exact & (hi < n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        interp = v_lo + (v_hi - v_lo) * (levels[None, :] - d_lo) / (d_hi - d_lo)
+    return np.where(exact, v_lo, np.where(between, interp, np.nan))
+
+def mixed_layer_depth(d, t, threshold: float = 0.2, ref_depth: float = 10.0):
+    """
+    Profundidad de la capa de mezcla por criterio de umbral: primera
+    profundidad bajo `ref_depth` donde |T - T(ref_depth)| > `threshold`,
+    interpolada entre las dos muestras que cruzan el umbral. NaN si el lance
+    no llega a la referencia o no cruza el umbral.
+    """
+    t_ref = interpolate(d, t, [ref_depth])[:, 0]
+    delta = np.abs(t - t_ref[:, None])
+    below = d > ref_depth
+    crossed = below & (delta > threshold)
+    has = crossed.any(axis=1) & ~np.isnan(t_ref)
+    k = crossed.argmax(axis=1)
+
+    rows = np.arange(d.shape[0])
+    prev = np.clip(k - 1, 0, None)
+    prev_below = below[rows, prev] & (k > 0)
+    # el tramo previo empieza en la muestra anterior o en la referencia
+    d0 = np.where(prev_below, d[rows, prev], ref_depth)
+    delta0 = np.where(prev_below, delta[rows, prev], 0.0)
+    d1, delta1 = d[rows, k], delta[rows, k]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mld = d0 + (threshold - delta0) * (d1 - d0) / (delta1 - delta0)
+    return np.where(has, mld, np.nan)
+
+def build_profiles(rows, levels=STANDARD_LEVELS, threshold: float = 0.2, ref_depth: float = 10.0):
+    """
+    rows: (cast_key, estacion, profundidad, temperatura, salinidad, oxigeno)
+    ordenadas por lance. Devuelve (claves de lance, estaciones, dict de
+    matrices interpoladas por variable, capa de mezcla, profundidad máxima).
+    """
+    if not rows:
+        empty = np.empty((0, len(levels)))
+        return [], [], {var: empty for var in VARIABLES}, np.empty(0), np.empty(0)
+
+    keys = [(r[0], r[1]) for r in rows]
+    data = np.array([r[2:6] for r in rows], dtype=float)
+    # índice de lance: las filas vienen agrupadas, un lance nuevo en cada cambio de clave
+    change = np.fromiter(
+        (i == 0 or keys[i] != keys[i - 1] for i in range(len(keys))), dtype=bool, count=len(keys)
+    )
+    cast_index = np.cumsum(change) - 1
+    n_casts = int(cast_index[-1]) + 1
+    first = np.flatnonzero(change)
+
+    depth = data[:, 0]
+    matrices = {}
+    values = {}
+    for i, var in enumerate(VARIABLES):
+        d, v = to_matrix(cast_index, depth, data[:, i + 1], n_casts)
+        matrices[var] = (d, v)
+        values[var] = interpolate(d, v, levels)
+
+    d_t, t = matrices["temperatura"]
+    mld = mixed_layer_depth(d_t, t, threshold, ref_depth)
+    max_depth = np.full(n_casts, np.nan)
+    np.fmax.at(max_depth, cast_index, depth)
+    return [keys[i][0] for i in first], [keys[i][1] for i in first], values, mld, max_depth
+
+def mean_profile(values):
+    """Perfil medio (lances x niveles -> niveles) ignorando NaN."""
+    count = (~np.isnan(values)).sum(axis=0)
+    total = np.nansum(values, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+def parse_levels(value: str):
+    """'0,10,50' -> tupla de niveles crecientes (ValueError si no es válida)."""
+    levels = tuple(float(p) for p in value.split(","))
+    if not levels or len(levels) > 200:
+        raise ValueError("entre 1 y 200 niveles")
+    if any(b <= a for a, b in zip(levels, levels[1:])) or levels[0] < 0:
+        raise ValueError("los niveles deben ser crecientes y no negativos")
+    return levels
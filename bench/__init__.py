@@ -0,0 +1,4 @@
+"""
+Benchmarks reproducibles: datos sintéticos, stub de ArcGIS, throughput del
+ETL y carga concurrente sobre la API. Uso: python -m bench.run --help
+"""
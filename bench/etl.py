@@ -0,0 +1,97 @@
+"""
+Throughput del ETL (app.etl.upsert_records) contra el stub de ArcGIS.
+
+Corre tres fases sobre OBJECTIDs nuevos (a continuación del máximo que ya
+hay en `mediciones`, así no pisa los datos de `generate`):
+
+- full: carga completa de `rows` registros (inserciones),
+- noop: corrida incremental sin cambios (solo el solapamiento del watermark),
+- edits: corrida incremental con una fracción de registros editados.
+"""
+import time
+from bench.stub_arcgis import StubConfig, StubServer
+
+
+def _snapshot():
+    from app.core.metrics import arcgis_duration, arcgis_retries, etl_stage_duration
+
+    return {
+        "stages": {s: etl_stage_duration.totals(stage=s)[0] for s in ("fetch", "transform", "write")},
+        "arcgis_requests": sum(arcgis_duration.totals(outcome=o)[1] for o in ("ok", "error")),
+        "arcgis_retries": arcgis_retries.value(),
+    }
+
+
+def _phase(name: str, full: bool, stub: StubConfig) -> dict:
+    from app.etl import upsert_records
+
+    before = _snapshot()
+    stub_before = stub.requests
+    t0 = time.perf_counter()
+    totals = upsert_records(full=full)
+    elapsed = time.perf_counter() - t0
+    after = _snapshot()
+
+    processed = sum(totals.values())
+    return {
+        "phase": name,
+        "seconds": round(elapsed, 3),
+        "rows": processed,
+        "rows_per_second": round(processed / elapsed, 1) if elapsed else None,
+        **totals,
+        "stages": {s: round(after["stages"][s] - before["stages"][s], 3) for s in after["stages"]},
+        "arcgis_requests": after["arcgis_requests"] - before["arcgis_requests"],
+        "arcgis_retries": int(after["arcgis_retries"] - before["arcgis_retries"]),
+        "stub_requests": stub.requests - stub_before,
+    }
+
+
+def run_etl_bench(rows: int, seed: int = 7, edit_fraction: float = 0.01,
+                  max_record_count: int = 2000, latency_ms: float = 0.0,
+                  error_rate: float = 0.0) -> dict:
+    from sqlalchemy import text
+    from app.core.config import settings
+    from app.db import SessionLocal
+    from app.etl import get_watermark
+
+    session = SessionLocal()
+    try:
+        first_oid = session.execute(text("SELECT coalesce(max(objectid), 0) + 1 FROM mediciones")).scalar()
+    finally:
+        session.close()
+
+    config = StubConfig(rows, seed=seed, max_record_count=max_record_count,
+                        latency_ms=latency_ms, error_rate=error_rate, first_oid=first_oid)
+    with StubServer(config) as stub:
+        # el cliente ArcGIS lee la URL de settings al crearse
+        settings.EXTERNAL_API_BASE_URL_METEROLOGIA = stub.base_url
+        settings.EXTERNAL_API_LAYER = "0"
+        settings.EXTERNAL_API_ENDPOINT = "query"
+
+        phases = [_phase("full", True, config), _phase("noop", False, config)]
+        session = SessionLocal()
+        try:
+            watermark = get_watermark(session)
+        finally:
+            session.close()
+        # ediciones posteriores al watermark: entran en la siguiente incremental
+        config.edit(edit_fraction, watermark + 60_000)
+        phases.append(_phase("edits", False, config))
+
+    return {
+        "rows": rows,
+        "first_objectid": first_oid,
+        "edit_fraction": edit_fraction,
+        "stub": {
+            "max_record_count": max_record_count,
+            "latency_ms": latency_ms,
+            "error_rate": error_rate,
+        },
+        "settings": {
+            "arc_batch_size": settings.arc_batch_size,
+            "arc_concurrency": settings.arc_concurrency,
+            "etl_batch_size": settings.etl_batch_size,
+            "etl_commit_every": settings.etl_commit_every,
+        },
+        "phases": phases,
+    }
@@ -0,0 +1,206 @@
+"""
+Carga concurrente sobre las rutas de antartica_routes y metereologia_routes.
+
+Los parámetros (años, estaciones, profundidades, objectids) se descubren de
+la propia API, así los escenarios sirven para cualquier escala de datos.
+Modo `cold` agrega un parámetro distinto por request (`_b=n`) para saltear
+la cache de respuestas; `warm` repite las mismas URLs.
+"""
+import asyncio
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import httpx
+
+
+@dataclass
+class Scenario:
+    name: str
+    urls: List[str]
+    # rutas pesadas (exportaciones / años completos) usan menos requests
+    weight: float = 1.0
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    bytes: int = 0
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    wall: float = 0.0
+
+    def summary(self) -> dict:
+        lat = sorted(self.latencies)
+        ok = len(lat)
+
+        def pct(p):
+            if not lat:
+                return None
+            return round(lat[min(ok - 1, int(round(p / 100.0 * (ok - 1))))] * 1000, 2)
+
+        return {
+            "requests": ok + self.errors,
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "p50_ms": pct(50),
+            "p90_ms": pct(90),
+            "p99_ms": pct(99),
+            "mean_ms": round(statistics.fmean(lat) * 1000, 2) if lat else None,
+            "max_ms": round(lat[-1] * 1000, 2) if lat else None,
+            "rps": round(ok / self.wall, 2) if self.wall else None,
+            "bytes": self.bytes,
+        }
+
+
+async def discover(client: httpx.AsyncClient) -> dict:
+    """Valores reales de la base para parametrizar los escenarios."""
+    async def get(url, **params):
+        response = await client.get(url, params=params, headers={"Accept-Encoding": "identity"})
+        return response.json()
+
+    years = (await get("/meteorologico/years"))["years"]
+    stations = (await get("/meteorologico/stations"))["stations"]
+    depths = (await get("/meteorologico/profundidades"))["profundidades"]
+    if not years or not stations:
+        raise SystemExit("La base está vacía: corra primero `python -m bench.run generate`")
+    first = await get(f"/meteorologico/mediciones/por-anio/{years[-1]}", limit=50, total="none")
+    oids = [f["properties"].get("OBJECTID") or f["properties"].get("objectid") for f in first.get("features", [])]
+    return {
+        "years": years,
+        "stations": [s if isinstance(s, str) else s.get("estacion") for s in stations],
+        "depths": depths,
+        "objectids": [o for o in oids if o is not None] or [1],
+    }
+
+
+def build_scenarios(params: dict, seed: int = 0) -> List[Scenario]:
+    rnd = random.Random(seed)
+    years, stations, depths = params["years"], params["stations"], params["depths"]
+    recent = years[-3:]
+
+    def pick(seq, n=8):
+        return [rnd.choice(seq) for _ in range(n)]
+
+    return [
+        # antartica_routes
+        Scenario("years", ["/meteorologico/years"]),
+        Scenario("stations", ["/meteorologico/stations"]),
+        Scenario("profundidades", ["/meteorologico/profundidades"]),
+        Scenario("objectid", [f"/meteorologico/objectid/{o}" for o in pick(params["objectids"])]),
+        Scenario("estacion", [f"/meteorologico/estacion/{s}?limit=100" for s in pick(stations)]),
+        Scenario("estacion_profundidades", [f"/meteorologico/estacion/{s}/profundidades" for s in pick(stations)]),
+        Scenario("profundidad", [f"/meteorologico/profundidad/{d}" for d in pick(depths, 4)], weight=0.25),
+        Scenario("filtrar", [f"/meteorologico/filtrar?station={s}&year={y}"
+                             for s, y in zip(pick(stations), pick(recent))], weight=0.5),
+        Scenario("years_station", [f"/meteorologico/years/{s}" for s in pick(stations)]),
+        Scenario("por_anio_paginado", [f"/meteorologico/mediciones/por-anio/{y}?limit=200&page={p}"
+                                       for y, p in zip(pick(years), pick(range(1, 6)))]),
+        Scenario("estaciones_por_anio", [f"/meteorologico/estaciones/por-anio/{y}" for y in pick(years)]),
+        Scenario("estaciones_cercanas", [f"/meteorologico/estaciones/cercanas?lon={rnd.uniform(-68, -55):.2f}"
+                                         f"&lat={rnd.uniform(-68, -61):.2f}&k=5" for _ in range(8)]),
+        Scenario("grilla", [f"/meteorologico/mediciones/grilla/{y}?zoom={z}"
+                            for y, z in zip(pick(recent), pick(range(2, 9)))]),
+        Scenario("series", [f"/meteorologico/series?station={s}&variable={v}"
+                            for s, v in zip(pick(stations), pick(("temperatura", "salinidad", "oxigeno")))]),
+        Scenario("perfil", [f"/meteorologico/perfil?station={s}&year={y}"
+                            for s, y in zip(pick(stations), pick(recent))], weight=0.5),
+        Scenario("por_anio_y_estacion", [f"/meteorologico/por-anio-y-estacion?year={y}&station={s}"
+                                         for s, y in zip(pick(stations), pick(recent))], weight=0.5),
+        Scenario("anio_stream", [f"/meteorologico/mediciones/anio/{y}" for y in pick(recent, 3)], weight=0.1),
+        Scenario("exportar_arrow", [f"/meteorologico/mediciones/exportar/{y}?formato=arrow"
+                                    for y in pick(recent, 3)], weight=0.1),
+        Scenario("csv", [f"/meteorologico/mediciones/csv?year={y}&station={s}"
+                         for s, y in zip(pick(stations, 3), pick(recent, 3))], weight=0.1),
+        Scenario("excel", [f"/meteorologico/mediciones/descargar-excel-estaciones/{y}"
+                           for y in pick(recent, 2)], weight=0.05),
+        # metereologia_routes
+        Scenario("met_anios", ["/anios"]),
+        Scenario("met_estaciones_anio", [f"/anio/{y}/estaciones" for y in pick(years)]),
+    ]
+
+
+async def _one(client, url: str, result: ScenarioResult):
+    # se lee el cuerpo tal como viaja (sin descomprimir): bytes en la red
+    t0 = time.perf_counter()
+    try:
+        async with client.stream("GET", url) as response:
+            async for chunk in response.aiter_raw():
+                result.bytes += len(chunk)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        result.errors += 1
+        result.statuses[type(e).__name__] = result.statuses.get(type(e).__name__, 0) + 1
+        return
+    elapsed = time.perf_counter() - t0
+    result.statuses[str(status)] = result.statuses.get(str(status), 0) + 1
+    if status >= 400:
+        result.errors += 1
+    else:
+        result.latencies.append(elapsed)
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int,
+                       cold: bool, counter: List[int]) -> ScenarioResult:
+    result = ScenarioResult(scenario.name)
+    total = max(1, int(requests * scenario.weight))
+    queue = asyncio.Queue()
+    for i in range(total):
+        url = scenario.urls[i % len(scenario.urls)]
+        if cold:
+            counter[0] += 1
+            url += ("&" if "?" in url else "?") + f"_b={counter[0]}"
+        queue.put_nowait(url)
+
+    async def worker():
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await _one(client, url, result)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    result.wall = time.perf_counter() - t0
+    return result
+
+
+async def run_load(base_url: str, requests: int = 200, concurrency: int = 16,
+                   mode: str = "warm", accept_encoding: Optional[str] = None,
+                   only: Optional[List[str]] = None, seed: int = 0,
+                   timeout: float = 300.0) -> dict:
+    headers = {"Accept-Encoding": accept_encoding or "identity"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits,
+                                 timeout=timeout) as client:
+        params = await discover(client)
+        scenarios = build_scenarios(params, seed)
+        if only:
+            scenarios = [s for s in scenarios if s.name in only]
+
+        counter = [int(time.time())]
+        results = {}
+        for scenario in scenarios:
+            if mode == "warm":
+                # una pasada previa llena la cache de respuestas
+                for url in scenario.urls:
+                    await _one(client, url, ScenarioResult(scenario.name))
+            res = await run_scenario(client, scenario, requests, concurrency, mode == "cold", counter)
+            results[scenario.name] = res.summary()
+            s = results[scenario.name]
+            print(f"  {scenario.name:24s} n={s['requests']:5d} err={s['errors']:3d} "
+                  f"p50={s['p50_ms']}ms p99={s['p99_ms']}ms rps={s['rps']}")
+
+    return {
+        "base_url": base_url,
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "accept_encoding": headers["Accept-Encoding"],
+        "dataset": {k: len(v) for k, v in params.items()},
+        "scenarios": results,
+    }
@@ -0,0 +1,280 @@
+"""
+Punto de entrada del benchmark:
+
+    python -m bench.run generate --rows 1000000 --reset
+    python -m bench.run etl --rows 100000
+    python -m bench.run load --spawn --requests 200 --concurrency 16
+    python -m bench.run all --rows 1000000 --reset
+    python -m bench.run compare bench/results/A.json bench/results/B.json
+
+Cada corrida escribe un JSON en bench/results/ con los metadatos de la
+máquina y el commit, para comparar regresiones entre commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "bench" / "results"
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def metadata() -> dict:
+    from app.core.config import settings
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_sha": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "postgres_host": settings.postgres_host,
+    }
+
+
+def dataset_rows() -> int:
+    from sqlalchemy import text
+    from app.db import SessionLocal
+
+    session = SessionLocal()
+    try:
+        return session.execute(text("SELECT count(*) FROM mediciones")).scalar()
+    finally:
+        session.close()
+
+
+def write_results(results: dict, output: str = None) -> Path:
+    path = Path(output) if output else RESULTS_DIR / "{}_{}.json".format(
+        datetime.now().strftime("%Y%m%d-%H%M%S"), (results["meta"]["git_sha"] or "nogit")[:8]
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Resultados: {path}")
+    return path
+
+
+class SpawnedServer:
+    """uvicorn en un subproceso, para medir la API sin levantarla a mano."""
+
+    def __init__(self, port: int, workers: int):
+        self.port = port
+        self.workers = workers
+        self.proc = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=ROOT,
+            # sin ETL programado: la carga no debe competir con una sincronización
+            env={**os.environ, "SYNC_ENABLED": "false"},
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(self.base_url + "/meteorologico/years", timeout=2).status_code < 500:
+                    return self
+            except httpx.HTTPError:
+                pass
+            if self.proc.poll() is not None:
+                raise SystemExit("uvicorn terminó antes de aceptar conexiones")
+            time.sleep(0.5)
+        raise SystemExit("uvicorn no respondió en 60 s")
+
+    def __exit__(self, *exc):
+        self.proc.send_signal(signal.SIGINT)
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+# --- subcomandos -----------------------------------------------------------
+
+def cmd_generate(args) -> dict:
+    from bench.synthetic import generate_db
+
+    return {"generate": generate_db(args.rows, seed=args.seed, chunk_rows=args.chunk_rows, reset=args.reset)}
+
+
+def cmd_etl(args) -> dict:
+    from bench.etl import run_etl_bench
+
+    return {"etl": run_etl_bench(
+        args.etl_rows, seed=args.seed, edit_fraction=args.edit_fraction,
+        max_record_count=args.max_record_count, latency_ms=args.stub_latency_ms,
+        error_rate=args.stub_error_rate,
+    )}
+
+
+def cmd_load(args) -> dict:
+    from bench.load import run_load
+
+    def run(base_url):
+        out = {}
+        for mode in args.modes.split(","):
+            print(f"Carga ({mode}) contra {base_url}")
+            out[mode] = asyncio.run(run_load(
+                base_url, requests=args.requests, concurrency=args.concurrency, mode=mode,
+                accept_encoding=args.accept_encoding, only=args.only, seed=args.seed,
+            ))
+        return out
+
+    if args.spawn:
+        with SpawnedServer(args.port, args.workers) as server:
+            return {"load": run(server.base_url)}
+    return {"load": run(args.base_url)}
+
+
+def cmd_stub(args):
+    from bench.stub_arcgis import StubConfig, StubServer
+
+    config = StubConfig(args.rows, seed=args.seed, max_record_count=args.max_record_count,
+                        latency_ms=args.stub_latency_ms, error_rate=args.stub_error_rate)
+    with StubServer(config, port=args.port) as stub:
+        print(f"Stub ArcGIS en {stub.base_url}/0/query ({args.rows} registros); Ctrl+C para terminar")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict) and "phase" in item:
+                _flatten(f"{prefix}.{item['phase']}", item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+# métricas donde más alto es peor (el resto: más alto es mejor)
+LOWER_IS_BETTER = ("_ms", "seconds", "errors")
+
+
+def cmd_compare(args):
+    base, new = (json.loads(Path(p).read_text()) for p in (args.baseline, args.candidate))
+    flat_base, flat_new = {}, {}
+    for key in ("generate", "etl", "load"):
+        _flatten(key, base.get(key), flat_base)
+        _flatten(key, new.get(key), flat_new)
+
+    print(f"baseline : {base['meta']['git_sha'][:8]} ({base['meta']['timestamp']})")
+    print(f"candidate: {new['meta']['git_sha'][:8]} ({new['meta']['timestamp']})")
+    regressions = 0
+    for metric in sorted(set(flat_base) & set(flat_new)):
+        if not metric.endswith(("_ms", "rps", "rows_per_second", "seconds", "errors")):
+            continue
+        a, b = flat_base[metric], flat_new[metric]
+        if a == b:
+            continue
+        change = (b - a) / a * 100 if a else float("inf")
+        worse = change > 0 if metric.endswith(LOWER_IS_BETTER) else change < 0
+        flag = ""
+        if worse and abs(change) >= args.threshold:
+            flag = "  <-- regresión"
+            regressions += 1
+        print(f"{metric:60s} {a:>12} -> {b:>12} ({change:+.1f}%){flag}")
+    print(f"{regressions} regresiones por encima de {args.threshold}%")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del ETL y de la API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--seed", type=int, default=42)
+        p.add_argument("--output", help="archivo JSON de resultados (por defecto bench/results/)")
+
+    def add_generate(p):
+        p.add_argument("--rows", type=int, default=100_000, help="filas sintéticas (10k - 10M)")
+        p.add_argument("--chunk-rows", type=int, default=500_000)
+        p.add_argument("--reset", action="store_true", help="vacía mediciones antes de generar")
+
+    def add_etl(p):
+        p.add_argument("--etl-rows", type=int, default=50_000, help="registros servidos por el stub")
+        p.add_argument("--edit-fraction", type=float, default=0.01)
+        p.add_argument("--max-record-count", type=int, default=2000)
+        p.add_argument("--stub-latency-ms", type=float, default=0.0)
+        p.add_argument("--stub-error-rate", type=float, default=0.0)
+
+    def add_load(p):
+        p.add_argument("--base-url", default="http://127.0.0.1:8000")
+        p.add_argument("--spawn", action="store_true", help="levanta uvicorn en un subproceso")
+        p.add_argument("--port", type=int, default=8089)
+        p.add_argument("--workers", type=int, default=1)
+        p.add_argument("--requests", type=int, default=200, help="requests por escenario (peso 1)")
+        p.add_argument("--concurrency", type=int, default=16)
+        p.add_argument("--modes", default="cold,warm", help="cold, warm o ambos")
+        p.add_argument("--accept-encoding", default=None, help="ej. 'gzip' o 'zstd'")
+        p.add_argument("--only", nargs="*", help="solo estos escenarios")
+
+    p = sub.add_parser("generate", help="carga datos sintéticos en Postgres")
+    add_common(p), add_generate(p)
+    p = sub.add_parser("etl", help="throughput del ETL contra el stub de ArcGIS")
+    add_common(p), add_etl(p)
+    p = sub.add_parser("load", help="carga concurrente sobre las rutas de la API")
+    add_common(p), add_load(p)
+    p = sub.add_parser("all", help="generate + etl + load")
+    add_common(p), add_generate(p), add_etl(p), add_load(p)
+    p = sub.add_parser("stub", help="solo el stub de ArcGIS (para correr app.etl a mano)")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--max-record-count", type=int, default=2000)
+    p.add_argument("--stub-latency-ms", type=float, default=0.0)
+    p.add_argument("--stub-error-rate", type=float, default=0.0)
+    p = sub.add_parser("compare", help="compara dos archivos de resultados")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--threshold", type=float, default=10.0, help="%% de cambio que cuenta como regresión")
+    p.add_argument("--fail-on-regression", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "stub":
+        return cmd_stub(args)
+    if args.command == "compare":
+        return cmd_compare(args)
+
+    steps = {
+        "generate": (cmd_generate,),
+        "etl": (cmd_etl,),
+        "load": (cmd_load,),
+        "all": (cmd_generate, cmd_etl, cmd_load),
+    }[args.command]
+    results = {"meta": metadata()}
+    for step in steps:
+        results.update(step(args))
+    results["meta"]["dataset_rows"] = dataset_rows()
+    write_results(results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Stub local del endpoint /query de un FeatureServer de ArcGIS para medir el
+ETL sin depender del servicio real. Soporta lo que usa el ETL:
+returnCountOnly, paginación con resultOffset / resultRecordCount (acotada
+por maxRecordCount, con exceededTransferLimit), orden por OBJECTID y el
+filtro incremental `last_edited_date >= TIMESTAMP '...'`. Puede inyectar
+latencia y una tasa de errores 503 para ejercitar los reintentos.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from bench.synthetic import feature_attributes, BASE_EDITED_MS
+
+WATERMARK_RE = re.compile(r"last_edited_date\s*>=\s*TIMESTAMP\s*'([^']+)'", re.IGNORECASE)
+
+
+class StubConfig:
+    def __init__(self, rows: int, seed: int = 0, max_record_count: int = 2000,
+                 latency_ms: float = 0.0, error_rate: float = 0.0, first_oid: int = 1):
+        self.rows = rows
+        self.first_oid = first_oid
+        self.oids = range(first_oid, first_oid + rows)
+        self.seed = seed
+        self.max_record_count = max_record_count
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        # registros "editados" después de la carga inicial: OBJECTID -> last_edited_date
+        self.edits = {}
+        self.requests = 0
+
+    def edit(self, fraction: float, at_ms: int):
+        """Marca como editada una fracción de los registros (carga incremental)."""
+        rnd = random.Random(self.seed + at_ms)
+        for oid in rnd.sample(self.oids, int(self.rows * fraction)):
+            self.edits[oid] = at_ms
+
+    def attributes(self, oid: int) -> dict:
+        attrs = feature_attributes(oid, self.seed)
+        if oid in self.edits:
+            attrs["last_edited_date"] = self.edits[oid]
+            attrs["Temperatura"] = round(attrs["Temperatura"] + 0.01, 3)
+        return attrs
+
+    def matching_oids(self, where: str):
+        match = WATERMARK_RE.search(where or "")
+        if not match:
+            return self.oids
+        ts = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        since = int(ts.timestamp() * 1000)
+        # last_edited_date base = BASE_EDITED_MS + oid (creciente con el OBJECTID)
+        first = max(self.first_oid, since - BASE_EDITED_MS)
+        base = range(first, self.oids.stop)
+        extra = sorted(oid for oid, edited in self.edits.items() if edited >= since and oid < first)
+        return extra + list(base) if extra else base
+
+
+def _handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict = None):
+            data = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            config.requests += 1
+            params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            if config.latency_ms:
+                time.sleep(config.latency_ms / 1000.0)
+            if config.error_rate and random.random() < config.error_rate:
+                self._send(503)
+                return
+
+            oids = config.matching_oids(params.get("where", "1=1"))
+            if params.get("returnCountOnly") == "true":
+                self._send(200, {"count": len(oids)})
+                return
+            if params.get("returnDistinctValues") == "true" or params.get("outStatistics"):
+                self._send(200, {"error": {"code": 400, "message": "No soportado por el stub"}})
+                return
+
+            offset = int(params.get("resultOffset", 0))
+            count = min(int(params.get("resultRecordCount", config.max_record_count)),
+                        config.max_record_count)
+            page = oids[offset:offset + count]
+            self._send(200, {
+                "objectIdFieldName": "OBJECTID",
+                "exceededTransferLimit": offset + count < len(oids),
+                "features": [{"attributes": config.attributes(oid)} for oid in page],
+            })
+
+    return Handler
+
+
+class StubServer:
+    """Servidor del stub en un hilo: with StubServer(config) as url: ..."""
+
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.httpd = ThreadingHTTPServer((host, port), _handler(config))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/arcgis/rest/services/bench/FeatureServer"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,195 @@
+"""
+Datos sintéticos con la forma de la capa real: lances (estación + fecha)
+con mediciones en profundidades estándar, más lances en verano austral y
+en los años recientes, perfiles de temperatura / salinidad / oxígeno con
+termoclina y ruido, y una fracción de coordenadas centinela (-99999).
+
+`generate_db` los escribe directo en Postgres con INSERT ... SELECT sobre
+generate_series (millones de filas sin pasar por Python); `feature_attributes`
+arma el mismo tipo de registro como atributos ArcGIS para el stub.
+"""
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+# estaciones alrededor de la Península Antártica / Shetland del Sur
+STATIONS = (
+    ("E01", -58.96, -62.19), ("E02", -58.40, -62.08), ("E03", -57.95, -61.98),
+    ("E04", -59.63, -62.47), ("E05", -60.37, -62.66), ("E06", -60.95, -62.92),
+    ("E07", -61.90, -63.21), ("E08", -62.55, -63.88), ("E09", -63.37, -64.21),
+    ("E10", -64.05, -64.77), ("E11", -56.62, -62.85), ("E12", -55.90, -63.30),
+    ("E13", -57.10, -63.55), ("E14", -58.70, -63.95), ("E15", -59.90, -64.40),
+    ("E16", -61.20, -65.10), ("E17", -62.80, -65.60), ("E18", -64.30, -66.20),
+    ("E19", -66.00, -67.10), ("E20", -67.50, -68.00),
+)
+DEPTH_LEVELS = (0, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500)
+FIRST_YEAR = 1995
+LAST_YEAR = 2024
+SENTINEL_FRACTION = 0.01
+BASE_EDITED_MS = 1_700_000_000_000
+
+
+def _temperature(depth, summer, noise):
+    surface = -0.8 + 2.6 * summer
+    deep = -1.2 + 0.9 * (1 - math.exp(-depth / 400.0))
+    return deep + (surface - deep) * math.exp(-depth / 45.0) + noise
+
+
+def feature_attributes(objectid: int, seed: int = 0) -> dict:
+    """Atributos ArcGIS deterministas para un OBJECTID (usado por el stub)."""
+    rnd = random.Random(seed * 1_000_003 + objectid)
+    cast = (objectid - 1) // len(DEPTH_LEVELS)
+    level = (objectid - 1) % len(DEPTH_LEVELS)
+    cast_rnd = random.Random(seed * 7_919 + cast)
+
+    name, lon, lat = STATIONS[int(len(STATIONS) * cast_rnd.random() ** 1.5)]
+    year = LAST_YEAR - int((LAST_YEAR - FIRST_YEAR + 1) * cast_rnd.random() ** 2)
+    # lances concentrados de noviembre a marzo
+    month = (10 + int(5 * cast_rnd.random())) % 12 + 1 if cast_rnd.random() < 0.8 else cast_rnd.randint(1, 12)
+    day = cast_rnd.randint(1, 28)
+    hour = cast_rnd.randint(0, 23)
+    fecha = datetime(year, month, day, hour, tzinfo=timezone.utc)
+    fecha_ms = int(fecha.timestamp() * 1000)
+    summer = 1.0 if month in (12, 1, 2) else 0.5 if month in (11, 3) else 0.0
+
+    depth = float(DEPTH_LEVELS[level])
+    if cast_rnd.random() < SENTINEL_FRACTION:
+        lon_v = lat_v = -99999.0
+    else:
+        lon_v = lon + cast_rnd.uniform(-0.02, 0.02)
+        lat_v = lat + cast_rnd.uniform(-0.02, 0.02)
+
+    return {
+        "OBJECTID": objectid,
+        "GlobalID": "{%08X-0000-4000-8000-%012X}" % (seed, objectid),
+        "Estacion": name,
+        "Fecha": fecha_ms,
+        "Longitud": lon_v,
+        "Latitud": lat_v,
+        "Profundidad": depth,
+        "Temperatura": round(_temperature(depth, summer, rnd.gauss(0, 0.08)), 3),
+        "Salinidad": round(33.9 + 0.75 * (1 - math.exp(-depth / 120.0)) + rnd.gauss(0, 0.02), 3),
+        "Oxigeno": None if rnd.random() < 0.05 else round(
+            7.4 - 1.6 * (1 - math.exp(-depth / 250.0)) + rnd.gauss(0, 0.1), 3
+        ),
+        "created_date": BASE_EDITED_MS + objectid,
+        "last_edited_date": BASE_EDITED_MS + objectid,
+    }
+
+
+def _insert_sql(first_cast: int, last_cast: int, first_oid: int, max_rows: int) -> str:
+    """INSERT ... SELECT de los lances [first_cast, last_cast]; hasta `max_rows` filas."""
+    from app.utils.geo import CELL_DEG, N_COLS, N_ROWS
+
+    n_st = len(STATIONS)
+    st_names = "ARRAY[" + ",".join(f"'{s[0]}'" for s in STATIONS) + "]"
+    st_lon = "ARRAY[" + ",".join(str(s[1]) for s in STATIONS) + "]::float8[]"
+    st_lat = "ARRAY[" + ",".join(str(s[2]) for s in STATIONS) + "]::float8[]"
+    levels = "ARRAY[" + ",".join(str(d) for d in DEPTH_LEVELS) + "]::float8[]"
+    years = LAST_YEAR - FIRST_YEAR + 1
+    cell = (
+        f"CASE WHEN lon BETWEEN -180 AND 180 AND lat BETWEEN -90 AND 90 THEN "
+        f"LEAST(GREATEST(FLOOR((lat + 90.0) / {CELL_DEG}), 0), {N_ROWS - 1})::int * {N_COLS} "
+        f"+ LEAST(GREATEST(FLOOR((lon + 180.0) / {CELL_DEG}), 0), {N_COLS - 1})::int END"
+    )
+    return f"""
+    INSERT INTO mediciones (
+        objectid, globalid, estacion, fecha_ms, fecha, longitud, latitud, profundidad,
+        temperatura, salinidad, oxigeno, created_date_ms, last_edited_date_ms, celda
+    )
+    SELECT oid, 'SYN-' || oid, estacion, (extract(epoch FROM fecha) * 1000)::bigint, fecha,
+           lon, lat, depth, temperatura, salinidad, oxigeno,
+           {BASE_EDITED_MS} + oid, {BASE_EDITED_MS} + oid, {cell}
+    FROM (
+        SELECT {first_oid} - 1 + row_number() OVER (ORDER BY c.id, l.ord) AS oid,
+               c.estacion, c.fecha, l.depth,
+               CASE WHEN c.sentinel THEN -99999 ELSE c.lon END AS lon,
+               CASE WHEN c.sentinel THEN -99999 ELSE c.lat END AS lat,
+               (-1.2 + 0.9 * (1 - exp(-l.depth / 400.0)))
+                 + ((-0.8 + 2.6 * c.summer) - (-1.2 + 0.9 * (1 - exp(-l.depth / 400.0))))
+                   * exp(-l.depth / 45.0)
+                 + (random() - 0.5) * 0.25 AS temperatura,
+               33.9 + 0.75 * (1 - exp(-l.depth / 120.0)) + (random() - 0.5) * 0.06 AS salinidad,
+               CASE WHEN random() < 0.05 THEN NULL
+                    ELSE 7.4 - 1.6 * (1 - exp(-l.depth / 250.0)) + (random() - 0.5) * 0.3 END AS oxigeno
+        FROM (
+            SELECT id,
+                   ({st_names})[st + 1] AS estacion,
+                   ({st_lon})[st + 1] + (random() - 0.5) * 0.04 AS lon,
+                   ({st_lat})[st + 1] + (random() - 0.5) * 0.04 AS lat,
+                   make_timestamp(yr, mon, 1 + floor(random() * 28)::int, floor(random() * 24)::int, 0, 0) AS fecha,
+                   CASE WHEN mon IN (12, 1, 2) THEN 1.0 WHEN mon IN (11, 3) THEN 0.5 ELSE 0.0 END AS summer,
+                   random() < {SENTINEL_FRACTION} AS sentinel,
+                   n_levels
+            FROM (
+                SELECT id,
+                       floor({n_st} * power(random(), 1.5))::int AS st,
+                       {LAST_YEAR} - floor({years} * power(random(), 2))::int AS yr,
+                       CASE WHEN random() < 0.8 THEN (10 + floor(random() * 5)::int) % 12 + 1
+                            ELSE 1 + floor(random() * 12)::int END AS mon,
+                       6 + floor(random() * {len(DEPTH_LEVELS) - 5})::int AS n_levels
+                FROM generate_series({first_cast}, {last_cast}) AS id
+            ) p
+        ) c
+        JOIN LATERAL unnest({levels}) WITH ORDINALITY AS l(depth, ord) ON l.ord <= c.n_levels
+        ORDER BY c.id, l.ord
+        LIMIT {max_rows}
+    ) s
+    """
+
+
+def generate_db(rows: int, seed: int = 42, chunk_rows: int = 500_000, reset: bool = False) -> dict:
+    """
+    Carga `rows` mediciones sintéticas y recalcula catálogos y series.
+    Con `reset` vacía antes las tablas; si no, falla cuando ya hay datos.
+    """
+    from sqlalchemy import text
+    from app.db import SessionLocal, engine, Base
+    from app.etl import save_watermark
+    from app.services.catalog_service import refresh_catalog
+    from app.services.rollup_service import refresh_rollups
+
+    Base.metadata.create_all(bind=engine)
+    avg_levels = (6 + len(DEPTH_LEVELS)) / 2
+    session = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        existing = session.execute(text("SELECT count(*) FROM mediciones")).scalar()
+        if existing and not reset:
+            raise SystemExit(f"mediciones ya tiene {existing} filas; use --reset para reemplazarlas")
+        if reset:
+            session.execute(text("TRUNCATE mediciones, sync_state RESTART IDENTITY"))
+        # setseed una vez por sesión: los chunks siguientes son deterministas
+        session.execute(text("SELECT setseed(:s)"), {"s": (seed % 2000) / 1000.0 - 1.0})
+
+        inserted, next_cast = 0, 1
+        while inserted < rows:
+            target = min(chunk_rows, rows - inserted)
+            n_casts = int(target / avg_levels) + 50
+            result = session.execute(
+                text(_insert_sql(next_cast, next_cast + n_casts - 1, inserted + 1, target))
+            )
+            session.commit()
+            inserted += result.rowcount
+            next_cast += n_casts
+            print(f"  {inserted}/{rows} filas ({time.perf_counter() - t0:.1f}s)")
+
+        t_load = time.perf_counter() - t0
+        refresh_catalog(session)
+        refresh_rollups(session)
+        save_watermark(session, BASE_EDITED_MS + rows, changed=True)
+        session.commit()
+        session.execute(text("ANALYZE mediciones"))
+        session.commit()
+    finally:
+        session.close()
+
+    total = time.perf_counter() - t0
+    return {
+        "rows": rows,
+        "seed": seed,
+        "load_seconds": round(t_load, 3),
+        "total_seconds": round(total, 3),
+        "rows_per_second": round(rows / t_load, 1) if t_load else None,
+    }
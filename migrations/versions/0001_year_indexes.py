@@ -0,0 +1,37 @@
+"""indices para filtros por año y estación
+
+Los filtros por año usan rangos semiabiertos sobre `fecha`, que Postgres
+puede resolver con estos índices. Se crean CONCURRENTLY para no bloquear
+`mediciones` en instalaciones con datos; IF NOT EXISTS cubre las bases
+creadas con `Base.metadata.create_all`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mediciones_fecha "
+            "ON mediciones (fecha)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mediciones_estacion_fecha "
+            "ON mediciones (estacion, fecha)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_mediciones_estacion_fecha")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_mediciones_fecha")
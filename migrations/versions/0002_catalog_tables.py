@@ -0,0 +1,64 @@
+"""tablas de catálogo de estaciones, años y profundidades
+
+Crea las tablas que lee la API para /stations, /years, /profundidades, etc.
+y las llena a partir de `mediciones`; después las mantiene el ETL.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "catalogo_estacion_anio" not in existing:
+        op.create_table(
+            "catalogo_estacion_anio",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("estacion", sa.String(255)),
+            sa.Column("anio", sa.Integer()),
+            sa.Column("registros", sa.Integer(), nullable=False),
+            sa.Column("registros_geo", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_catalogo_estacion_anio_estacion", "catalogo_estacion_anio", ["estacion"])
+        op.create_index("ix_catalogo_estacion_anio_anio", "catalogo_estacion_anio", ["anio"])
+
+    if "catalogo_profundidad" not in existing:
+        op.create_table(
+            "catalogo_profundidad",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("estacion", sa.String(255)),
+            sa.Column("profundidad", sa.Float()),
+            sa.Column("registros", sa.Integer(), nullable=False),
+            sa.Column("registros_geo", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_catalogo_profundidad_estacion", "catalogo_profundidad", ["estacion"])
+
+    geo = "count(*) FILTER (WHERE longitud <> -99999 AND latitud <> -99999)"
+    op.execute("DELETE FROM catalogo_estacion_anio")
+    op.execute(
+        "INSERT INTO catalogo_estacion_anio (estacion, anio, registros, registros_geo) "
+        f"SELECT estacion, CAST(EXTRACT(year FROM fecha) AS INTEGER), count(*), {geo} "
+        "FROM mediciones GROUP BY 1, 2"
+    )
+    op.execute("DELETE FROM catalogo_profundidad")
+    op.execute(
+        "INSERT INTO catalogo_profundidad (estacion, profundidad, registros, registros_geo) "
+        f"SELECT estacion, profundidad, count(*), {geo} "
+        "FROM mediciones GROUP BY 1, 2"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("catalogo_profundidad")
+    op.drop_table("catalogo_estacion_anio")
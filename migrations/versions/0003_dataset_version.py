@@ -0,0 +1,28 @@
+"""versión del dataset para invalidar la cache de respuestas
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # sync_state la crea el ETL con create_all (ya con la columna)
+    if "sync_state" in sa.inspect(op.get_bind()).get_table_names():
+        op.execute(
+            "ALTER TABLE sync_state "
+            "ADD COLUMN IF NOT EXISTS dataset_version INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE sync_state DROP COLUMN IF EXISTS dataset_version")
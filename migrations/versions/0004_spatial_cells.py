@@ -0,0 +1,65 @@
+"""celda de grilla lon/lat para filtros bbox / radio
+
+Agrega `mediciones.celda` (id de celda de 0.1°, ver app/utils/geo.py) con
+índice btree, y la posición media de cada estación en el catálogo para la
+búsqueda de estaciones cercanas. La fórmula SQL replica geo.cell_id.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+CELL_SQL = (
+    "CASE WHEN longitud BETWEEN -180 AND 180 AND latitud BETWEEN -90 AND 90 THEN "
+    "LEAST(GREATEST(FLOOR((latitud + 90.0) / 0.1), 0), 1799)::int * 3600 "
+    "+ LEAST(GREATEST(FLOOR((longitud + 180.0) / 0.1), 0), 3599)::int END"
+)
+
+
+def upgrade() -> None:
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "mediciones" in existing:
+        op.execute("ALTER TABLE mediciones ADD COLUMN IF NOT EXISTS celda INTEGER")
+        op.execute(f"UPDATE mediciones SET celda = {CELL_SQL} WHERE celda IS NULL")
+
+    if "catalogo_estacion_anio" in existing:
+        op.execute(
+            "ALTER TABLE catalogo_estacion_anio "
+            "ADD COLUMN IF NOT EXISTS longitud DOUBLE PRECISION, "
+            "ADD COLUMN IF NOT EXISTS latitud DOUBLE PRECISION"
+        )
+        valid = "longitud <> -99999 AND latitud <> -99999"
+        op.execute(
+            "UPDATE catalogo_estacion_anio c SET longitud = p.longitud, latitud = p.latitud "
+            f"FROM (SELECT estacion, CAST(EXTRACT(year FROM fecha) AS INTEGER) AS anio, "
+            f"avg(longitud) FILTER (WHERE {valid}) AS longitud, "
+            f"avg(latitud) FILTER (WHERE {valid}) AS latitud "
+            "FROM mediciones GROUP BY 1, 2) p "
+            "WHERE c.estacion IS NOT DISTINCT FROM p.estacion "
+            "AND c.anio IS NOT DISTINCT FROM p.anio"
+        )
+
+    if "mediciones" in existing:
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_mediciones_celda "
+                "ON mediciones (celda)"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_mediciones_celda")
+    op.execute("ALTER TABLE catalogo_estacion_anio DROP COLUMN IF EXISTS latitud")
+    op.execute("ALTER TABLE catalogo_estacion_anio DROP COLUMN IF EXISTS longitud")
+    op.execute("ALTER TABLE mediciones DROP COLUMN IF EXISTS celda")
@@ -0,0 +1,63 @@
+"""series diarias y mensuales por estación y profundidad
+
+Crea `serie_diaria` y `serie_mensual` (min / max / media / conteos de
+temperatura, salinidad y oxígeno) y las llena desde `mediciones`; después
+las mantiene el ETL para el rango de fechas de cada carga.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+VARIABLES = ("temperatura", "salinidad", "oxigeno")
+ROLLUPS = (("serie_diaria", "day"), ("serie_mensual", "month"))
+
+
+def upgrade() -> None:
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    for table, unit in ROLLUPS:
+        if table not in existing:
+            columns = [
+                sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+                sa.Column("estacion", sa.String(255)),
+                sa.Column("profundidad", sa.Float()),
+                sa.Column("periodo", sa.DateTime(), nullable=False),
+                sa.Column("registros", sa.Integer(), nullable=False),
+            ]
+            for var in VARIABLES:
+                columns += [
+                    sa.Column(f"{var}_min", sa.Float()),
+                    sa.Column(f"{var}_max", sa.Float()),
+                    sa.Column(f"{var}_media", sa.Float()),
+                    sa.Column(f"{var}_n", sa.Integer()),
+                ]
+            op.create_table(table, *columns)
+            op.create_index(f"ix_{table}_estacion_periodo", table, ["estacion", "periodo"])
+            op.create_index(f"ix_{table}_periodo", table, ["periodo"])
+
+        names = ["estacion", "profundidad", "periodo", "registros"]
+        aggs = ["count(*)"]
+        for var in VARIABLES:
+            names += [f"{var}_min", f"{var}_max", f"{var}_media", f"{var}_n"]
+            aggs += [f"min({var})", f"max({var})", f"avg({var})", f"count({var})"]
+        op.execute(f"DELETE FROM {table}")
+        op.execute(
+            f"INSERT INTO {table} ({', '.join(names)}) "
+            f"SELECT estacion, profundidad, date_trunc('{unit}', fecha), {', '.join(aggs)} "
+            "FROM mediciones WHERE fecha IS NOT NULL GROUP BY 1, 2, 3"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("serie_mensual")
+    op.drop_table("serie_diaria")
@@ -0,0 +1,45 @@
+"""estado de la última corrida del ETL en sync_state
+
+Columnas para GET /sync/status: inicio / fin / duración, resultado, filas
+insertadas / actualizadas / sin cambios, último error y el worker que
+cargó (el ETL programado corre dentro del servicio).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ("last_run_started_at", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("last_run_finished_at", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("last_run_duration_s", "DOUBLE PRECISION"),
+    ("last_run_status", "VARCHAR(20)"),
+    ("last_run_by", "VARCHAR(100)"),
+    ("last_run_inserted", "INTEGER"),
+    ("last_run_updated", "INTEGER"),
+    ("last_run_unchanged", "INTEGER"),
+    ("last_error", "TEXT"),
+    ("last_error_at", "TIMESTAMP WITHOUT TIME ZONE"),
+    ("consecutive_failures", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def upgrade() -> None:
+    # sync_state la crea el ETL con create_all (ya con las columnas)
+    if "sync_state" in sa.inspect(op.get_bind()).get_table_names():
+        for name, ddl in COLUMNS:
+            op.execute(f"ALTER TABLE sync_state ADD COLUMN IF NOT EXISTS {name} {ddl}")
+
+
+def downgrade() -> None:
+    for name, _ in reversed(COLUMNS):
+        op.execute(f"ALTER TABLE sync_state DROP COLUMN IF EXISTS {name}")
@@ -0,0 +1,33 @@
+"""marca de cambios pendientes en sync_state
+
+Con ETL_COMMIT_EVERY el ETL confirma datos antes del final de la corrida;
+si la corrida falla, `pending_changes` queda en true y la siguiente
+incrementa dataset_version y recalcula los derivados aunque re-lea los
+mismos registros como 'unchanged'.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # sync_state la crea el ETL con create_all (ya con la columna)
+    if "sync_state" in sa.inspect(op.get_bind()).get_table_names():
+        op.execute(
+            "ALTER TABLE sync_state "
+            "ADD COLUMN IF NOT EXISTS pending_changes BOOLEAN NOT NULL DEFAULT false"
+        )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE sync_state DROP COLUMN IF EXISTS pending_changes")
@@ -0,0 +1,37 @@
+"""días pendientes de recalcular en las series
+
+`serie_pendiente` guarda (estación, día) de las mediciones nuevas o
+modificadas; el ETL la llena con cada lote y recalcula solo esos días y
+meses. Las series dejan de agregar filas sin estación (se consultan
+siempre por estación).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if "serie_pendiente" not in existing:
+        op.create_table(
+            "serie_pendiente",
+            sa.Column("estacion", sa.String(255), primary_key=True),
+            sa.Column("dia", sa.DateTime(), primary_key=True),
+        )
+    for table in ("serie_diaria", "serie_mensual"):
+        if table in existing:
+            op.execute(f"DELETE FROM {table} WHERE estacion IS NULL")
+
+
+def downgrade() -> None:
+    op.drop_table("serie_pendiente")
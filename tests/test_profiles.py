@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.utils import profiles
+from app.utils.profiles import (
+    build_profiles,
+    interpolate,
+    mean_profile,
+    mixed_layer_depth,
+    parse_levels,
+    to_matrix,
+)
+
+
+def test_to_matrix_pads_sorts_and_drops_nulls():
+    # lance 0: tres muestras desordenadas, una con valor nulo; lance 1: una muestra
+    cast_index = np.array([0, 0, 0, 1])
+    depth = np.array([20.0, 0.0, 10.0, 5.0])
+    value = np.array([2.0, 0.0, np.nan, 7.0])
+
+    d, v = to_matrix(cast_index, depth, value, 2)
+
+    assert d.shape == v.shape == (2, 3)
+    np.testing.assert_array_equal(d[0], [0.0, 20.0, np.inf])
+    np.testing.assert_array_equal(v[0], [0.0, 2.0, np.nan])
+    np.testing.assert_array_equal(d[1], [5.0, np.inf, np.inf])
+    np.testing.assert_array_equal(v[1], [7.0, np.nan, np.nan])
+
+
+def test_interpolate_exact_levels_and_linear_between():
+    d = np.array([[0.0, 10.0, 30.0]])
+    v = np.array([[1.0, 2.0, 4.0]])
+
+    out = interpolate(d, v, [0, 10, 20, 30])
+
+    np.testing.assert_allclose(out, [[1.0, 2.0, 3.0, 4.0]])
+
+
+def test_interpolate_nan_outside_measured_range():
+    d = np.array([[5.0, 15.0, np.inf]])
+    v = np.array([[1.0, 3.0, np.nan]])
+
+    out = interpolate(d, v, [0, 5, 10, 15, 20])
+
+    # no se extrapola por arriba ni por debajo del rango medido
+    assert np.isnan(out[0, 0])
+    np.testing.assert_allclose(out[0, 1:4], [1.0, 2.0, 3.0])
+    assert np.isnan(out[0, 4])
+
+
+def test_interpolate_same_result_with_blocks(monkeypatch):
+    rnd = np.random.default_rng(0)
+    d = np.sort(rnd.uniform(0, 500, (300, 40)), axis=1)
+    d[::7, 30:] = np.inf  # lances más cortos (relleno)
+    v = np.where(np.isfinite(d), rnd.normal(size=d.shape), np.nan)
+
+    whole = interpolate(d, v, profiles.STANDARD_LEVELS)
+    monkeypatch.setattr(profiles, "INTERP_BLOCK_CELLS", 1000)
+    blocked = interpolate(d, v, profiles.STANDARD_LEVELS)
+
+    np.testing.assert_array_equal(whole, blocked)
+
+
+def test_mixed_layer_depth_interpolates_threshold_crossing():
+    # T(10 m) = 5.0; |ΔT| = 0.1 a 20 m y 0.8 a 30 m: cruza 0.2 en 20 + 10 * 0.1 / 0.7
+    d = np.array([[0.0, 10.0, 20.0, 30.0]])
+    t = np.array([[5.0, 5.0, 4.9, 4.2]])
+
+    mld = mixed_layer_depth(d, t, threshold=0.2, ref_depth=10.0)
+
+    assert mld[0] == pytest.approx(21.43, abs=0.01)
+
+
+def test_mixed_layer_depth_nan_without_crossing_or_reference():
+    d = np.array([[0.0, 10.0, 50.0], [20.0, 30.0, 40.0]])
+    t = np.array([[5.0, 5.0, 4.95], [5.0, 3.0, 1.0]])
+
+    mld = mixed_layer_depth(d, t, threshold=0.2, ref_depth=10.0)
+
+    assert np.isnan(mld).all()
+
+
+def test_build_profiles_groups_casts_by_key():
+    day1, day2 = datetime(2020, 1, 1), datetime(2020, 1, 2)
+    rows = [
+        (day1, "E01", 0.0, 1.0, 34.0, 7.0),
+        (day1, "E01", 10.0, 2.0, 34.5, 6.0),
+        (day2, "E01", 0.0, 3.0, 34.0, 7.0),
+        (day2, "E01", 10.0, 4.0, 34.5, 6.0),
+    ]
+
+    keys, stations, values, _mld, max_depth = build_profiles(rows, levels=(0, 5, 10))
+
+    assert keys == [day1, day2]
+    assert stations == ["E01", "E01"]
+    np.testing.assert_allclose(values["temperatura"], [[1.0, 1.5, 2.0], [3.0, 3.5, 4.0]])
+    np.testing.assert_allclose(max_depth, [10.0, 10.0])
+    np.testing.assert_allclose(mean_profile(values["temperatura"]), [2.0, 2.5, 3.0])
+
+
+def test_parse_levels_rejects_unordered():
+    assert parse_levels("0,10,50") == (0.0, 10.0, 50.0)
+    with pytest.raises(ValueError):
+        parse_levels("10,5")